@@ -8,19 +8,34 @@ Requires Full Disk Access permission in System Preferences > Privacy & Security.
 
 import argparse
 import csv
-import json
 import os
 import shutil
 import sqlite3
+import subprocess
 import sys
 import tempfile
-from datetime import datetime, timedelta
+from datetime import date, datetime, timedelta
+from itertools import groupby
 from pathlib import Path
-from typing import Optional
+from typing import Iterator, Optional
+
+from screentime_format import dumps_json, format_duration
 
 # Apple Core Data epoch offset (seconds between 2001-01-01 and 1970-01-01)
 APPLE_EPOCH_OFFSET = 978307200
 
+# An app usage session: (app_name, duration_seconds, start_time, end_time)
+UsageRow = tuple[str, float, Optional[datetime], Optional[datetime]]
+
+# Linux ioctl request to clone a file's extents (linux/fs.h)
+FICLONE = 0x40049409
+
+# Rows fetched per cursor.fetchmany() call when streaming results
+FETCH_BATCH_SIZE = 8192
+
+# Full-width usage bar for terminal output; shorter bars are slices of it
+MAX_BAR = "█" * 20
+
 # Default database location
 DEFAULT_DB_PATH = Path.home() / "Library/Application Support/Knowledge/knowledgeC.db"
 
@@ -38,6 +53,33 @@ def datetime_to_apple_time(dt: datetime) -> float:
     return dt.timestamp() - APPLE_EPOCH_OFFSET
 
 
+def clone_file(src: Path, dst: Path):
+    """
+    Copy a file, sharing its blocks copy-on-write where the filesystem allows.
+
+    Clones are near-instant regardless of size: APFS via `cp -c` on macOS,
+    Btrfs/XFS via the FICLONE ioctl on Linux. Anything else falls back to
+    shutil.copy2, which raises the usual errors for a missing or unreadable
+    source.
+    """
+    if sys.platform == "darwin":
+        result = subprocess.run(["cp", "-c", str(src), str(dst)], capture_output=True)
+        if result.returncode == 0:
+            return
+    elif sys.platform.startswith("linux"):
+        # fcntl is POSIX-only; importing it here keeps the module importable elsewhere
+        import fcntl
+
+        try:
+            with open(src, "rb") as fsrc, open(dst, "wb") as fdst:
+                fcntl.ioctl(fdst.fileno(), FICLONE, fsrc.fileno())
+            return
+        except OSError:
+            pass
+
+    shutil.copy2(src, dst)
+
+
 def copy_database_to_temp(db_path: Path) -> Path:
     """
     Copy the database to a temporary location to avoid locking issues.
@@ -47,35 +89,100 @@ def copy_database_to_temp(db_path: Path) -> Path:
     temp_db = Path(temp_dir) / "knowledgeC.db"
 
     # Copy main database file
-    shutil.copy2(db_path, temp_db)
+    clone_file(db_path, temp_db)
 
-    # Also copy WAL and SHM files if they exist (for consistency)
+    # Also copy WAL and SHM files if they exist (for consistency). Copying
+    # and handling a missing file avoids a separate exists() stat per file,
+    # and the race where the system checkpoints one away in between.
     for suffix in ["-wal", "-shm"]:
         wal_file = db_path.parent / (db_path.name + suffix)
-        if wal_file.exists():
-            shutil.copy2(wal_file, temp_db.parent / (temp_db.name + suffix))
+        try:
+            clone_file(wal_file, temp_db.parent / (temp_db.name + suffix))
+        except FileNotFoundError:
+            pass
 
     return temp_db
 
 
-def get_app_usage(
-    db_path: Path,
-    start_date: Optional[datetime] = None,
-    end_date: Optional[datetime] = None
-) -> list[dict]:
+def create_usage_index(db_path: Path):
     """
-    Extract app usage data from the knowledgeC.db database.
+    Add a covering index for the app usage queries to a writable copy.
 
-    Returns a list of dicts with: app_name, duration_seconds, start_time, end_time
+    Never call this on the live knowledgeC.db; it is meant for temp copies
+    that are read many times, so the one-off index build pays for itself.
     """
-    # Build the query
-    query = """
-        SELECT
-            ZVALUESTRING as app_name,
-            ZENDDATE - ZSTARTDATE as duration_seconds,
-            ZSTARTDATE as start_timestamp,
-            ZENDDATE as end_timestamp
-        FROM ZOBJECT
+    conn = sqlite3.connect(db_path)
+    try:
+        conn.execute("""
+            CREATE INDEX IF NOT EXISTS ix_app_usage
+            ON ZOBJECT(ZSTREAMNAME, ZSTARTDATE DESC, ZENDDATE, ZVALUESTRING)
+            WHERE ZVALUESTRING IS NOT NULL
+        """)
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def apply_read_pragmas(conn: sqlite3.Connection):
+    """Tune a connection for large read-only scans.
+
+    Keeps sorts and GROUP BY temp tables in memory, and serves pages from a
+    64 MiB page cache and a 256 MiB memory map instead of read() calls.
+    """
+    conn.execute("PRAGMA query_only = 1")
+    conn.execute("PRAGMA temp_store = MEMORY")
+    conn.execute("PRAGMA cache_size = -65536")
+    conn.execute("PRAGMA mmap_size = 268435456")
+
+
+def connect_readonly(db_path: Path, check_same_thread: bool = True) -> sqlite3.Connection:
+    """Open the database read-only in place, without copying it.
+
+    Lock errors are raised at once rather than after sqlite3's default 5s
+    busy wait, so callers fall back to a copy without stalling.
+    """
+    conn = sqlite3.connect(
+        f"{db_path.absolute().as_uri()}?mode=ro",
+        uri=True,
+        timeout=0,
+        check_same_thread=check_same_thread,
+    )
+    apply_read_pragmas(conn)
+    return conn
+
+
+def query_database(db_path: Path, query_fn, *args):
+    """Run query_fn(conn, *args) on a fresh read-only connection to db_path."""
+    conn = connect_readonly(db_path)
+    try:
+        return query_fn(conn, *args)
+    finally:
+        conn.close()
+
+
+def read_database(db_path: Path, query_fn, *args):
+    """
+    Run query_fn(conn, *args) against the database opened in place.
+
+    Falls back to querying a temporary copy only when SQLite cannot read the
+    live file, e.g. while the system holds a lock on it.
+    """
+    try:
+        return query_database(db_path, query_fn, *args)
+    except sqlite3.OperationalError:
+        temp_db = copy_database_to_temp(db_path)
+        try:
+            return query_database(temp_db, query_fn, *args)
+        finally:
+            shutil.rmtree(temp_db.parent, ignore_errors=True)
+
+
+def build_usage_filter(
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None
+) -> tuple[str, list]:
+    """Build the WHERE clause and parameters selecting app usage sessions."""
+    where = """
         WHERE ZSTREAMNAME = '/app/usage'
             AND ZVALUESTRING IS NOT NULL
     """
@@ -83,76 +190,230 @@ def get_app_usage(
     params = []
 
     if start_date:
-        query += " AND ZSTARTDATE >= ?"
+        where += " AND ZSTARTDATE >= ?"
         params.append(datetime_to_apple_time(start_date))
 
     if end_date:
-        query += " AND ZENDDATE <= ?"
+        where += " AND ZENDDATE <= ?"
         params.append(datetime_to_apple_time(end_date))
 
-    query += " ORDER BY ZSTARTDATE DESC"
+    return where, params
 
-    conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
-    conn.row_factory = sqlite3.Row
 
-    try:
-        cursor = conn.execute(query, params)
-        results = []
+def build_app_usage_query(
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None,
+    limit: Optional[int] = None,
+    before: Optional[tuple[float, int]] = None
+) -> tuple[str, list]:
+    """Build the query selecting individual app usage sessions, newest first.
+
+    Each row ends with its (ZSTARTDATE, Z_PK) key, which orders sessions
+    uniquely even when they share a start time. With `before`, the key of a
+    previous page's last row, only sessions after it in that order are
+    selected, for keyset pagination. Sessions without a start time have no
+    place in the order and are left out.
+    """
+    where, params = build_usage_filter(start_date, end_date)
+    where += " AND ZSTARTDATE IS NOT NULL"
 
-        for row in cursor:
-            results.append({
-                "app_name": row["app_name"],
-                "duration_seconds": row["duration_seconds"] or 0,
-                "start_time": apple_time_to_datetime(row["start_timestamp"]),
-                "end_time": apple_time_to_datetime(row["end_timestamp"]),
-            })
+    if before:
+        where += " AND (ZSTARTDATE, Z_PK) < (?, ?)"
+        params.extend(before)
 
-        return results
-    finally:
-        conn.close()
+    # Shift to Unix time in SQLite so each timestamp needs a single
+    # datetime.fromtimestamp call in Python
+    query = f"""
+        SELECT
+            ZVALUESTRING as app_name,
+            ZENDDATE - ZSTARTDATE as duration_seconds,
+            ZSTARTDATE + {APPLE_EPOCH_OFFSET} as start_unix,
+            ZENDDATE + {APPLE_EPOCH_OFFSET} as end_unix,
+            ZSTARTDATE,
+            Z_PK
+        FROM ZOBJECT
+    """ + where + " ORDER BY ZSTARTDATE DESC, Z_PK DESC"
 
+    if limit:
+        query += " LIMIT ?"
+        params.append(limit)
 
-def aggregate_by_app(usage_data: list[dict]) -> list[dict]:
-    """Aggregate usage data by app, summing total duration."""
-    app_totals = {}
+    return query, params
+
+
+def get_app_usage_page(
+    conn: sqlite3.Connection,
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None,
+    limit: Optional[int] = None,
+    before: Optional[tuple[float, int]] = None
+) -> tuple[list[UsageRow], Optional[tuple[float, int]]]:
+    """
+    Extract a page of app usage data from the knowledgeC.db database.
+
+    Returns (rows, next_key). Rows are (app_name, duration_seconds,
+    start_time, end_time) tuples, newest first, at most `limit` of them when
+    set, and only those after the `before` key when set. When `limit` fills
+    the page, next_key is the key to pass as `before` for the next one;
+    otherwise it is None.
+    """
+    query, params = build_app_usage_query(start_date, end_date, limit, before)
+    rows = conn.execute(query, params).fetchall()
+    fromtimestamp = datetime.fromtimestamp
+
+    # Plain tuples rather than a dict per row; callers unpack them
+    usage = [
+        (
+            app_name,
+            duration or 0,
+            fromtimestamp(start_unix),
+            fromtimestamp(end_unix) if end_unix is not None else None,
+        )
+        for app_name, duration, start_unix, end_unix, _, _ in rows
+    ]
+    next_key = rows[-1][4:] if limit and len(rows) == limit else None
+    return usage, next_key
 
-    for entry in usage_data:
-        app = entry["app_name"]
-        if app not in app_totals:
-            app_totals[app] = 0
-        app_totals[app] += entry["duration_seconds"]
 
-    # Convert to list and sort by duration descending
-    result = [
+def get_app_usage(
+    conn: sqlite3.Connection,
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None
+) -> list[UsageRow]:
+    """
+    Extract app usage data from the knowledgeC.db database.
+
+    Returns a list of (app_name, duration_seconds, start_time, end_time) tuples,
+    newest first.
+    """
+    return get_app_usage_page(conn, start_date, end_date)[0]
+
+
+def stream_app_usage_rows(
+    conn: sqlite3.Connection,
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None
+) -> Iterator[tuple]:
+    """
+    Stream app usage sessions straight from the database cursor.
+
+    Yields (app_name, duration_seconds, start_time, end_time) tuples with ISO
+    8601 timestamps, ready for CSV/JSON writers. The query runs before this
+    returns, so lock errors surface to the caller immediately. The connection
+    must stay open until the rows are exhausted.
+    """
+    query, params = build_app_usage_query(start_date, end_date)
+    cursor = conn.execute(query, params)
+
+    def rows():
+        fromtimestamp = datetime.fromtimestamp
+        for batch in iter(lambda: cursor.fetchmany(FETCH_BATCH_SIZE), []):
+            for app_name, duration, start_unix, end_unix, _, _ in batch:
+                yield (
+                    app_name,
+                    duration or 0,
+                    fromtimestamp(start_unix).isoformat(),
+                    fromtimestamp(end_unix).isoformat() if end_unix is not None else None,
+                )
+
+    return rows()
+
+
+def get_app_totals(
+    conn: sqlite3.Connection,
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None,
+    limit: Optional[int] = None
+) -> tuple[list[dict], float]:
+    """
+    Sum app usage per app inside SQLite.
+
+    Returns (apps, grand_total): a list of dicts with app_name and
+    total_duration_seconds, sorted by duration descending, for the top
+    `limit` apps when set; and the total duration across all apps.
+    """
+    where, params = build_usage_filter(start_date, end_date)
+
+    # The window sum is evaluated over every group, before LIMIT applies
+    query = """
+        SELECT
+            ZVALUESTRING as app_name,
+            TOTAL(ZENDDATE - ZSTARTDATE) as total_duration_seconds,
+            TOTAL(TOTAL(ZENDDATE - ZSTARTDATE)) OVER () as grand_total
+        FROM ZOBJECT
+    """ + where + """
+        GROUP BY ZVALUESTRING
+        ORDER BY total_duration_seconds DESC
+    """
+
+    if limit:
+        query += " LIMIT ?"
+        params.append(limit)
+
+    rows = conn.execute(query, params).fetchall()
+    grand_total = rows[0][2] if rows else 0.0
+
+    apps = [
         {"app_name": app, "total_duration_seconds": duration}
-        for app, duration in app_totals.items()
+        for app, duration, _ in rows
     ]
-    result.sort(key=lambda x: x["total_duration_seconds"], reverse=True)
+    return apps, grand_total
 
-    return result
 
+def get_daily_totals(
+    conn: sqlite3.Connection,
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None,
+    top_n: Optional[int] = None
+) -> list[dict]:
+    """
+    Sum app usage per local calendar day and app inside SQLite.
 
-def format_duration(seconds: float) -> str:
-    """Format duration in human-readable format."""
-    if seconds is None or seconds < 0:
-        return "0s"
+    Returns a list of dicts with: date, app_name, total_duration_seconds and
+    day_total_seconds (the day's total across all apps), sorted by date
+    descending, then by duration descending. Only the top `top_n` apps of
+    each day are returned when set.
+    """
+    where, params = build_usage_filter(start_date, end_date)
+
+    # Bucket sessions by the local day they started on, as datetime.date() did
+    day = f"date(ZSTARTDATE + {APPLE_EPOCH_OFFSET}, 'unixepoch', 'localtime')"
+
+    # Window functions run after GROUP BY, over each day's per-app totals
+    query = f"""
+        SELECT day, app_name, total_duration_seconds, day_total_seconds FROM (
+            SELECT
+                {day} as day,
+                ZVALUESTRING as app_name,
+                TOTAL(ZENDDATE - ZSTARTDATE) as total_duration_seconds,
+                TOTAL(TOTAL(ZENDDATE - ZSTARTDATE)) OVER days as day_total_seconds,
+                ROW_NUMBER() OVER (days ORDER BY TOTAL(ZENDDATE - ZSTARTDATE) DESC) as app_rank
+            FROM ZOBJECT
+    """ + where + f"""
+                AND ZSTARTDATE IS NOT NULL
+            GROUP BY day, ZVALUESTRING
+            WINDOW days AS (PARTITION BY {day})
+        )
+    """
 
-    hours = int(seconds // 3600)
-    minutes = int((seconds % 3600) // 60)
-    secs = int(seconds % 60)
+    if top_n:
+        query += " WHERE app_rank <= ?"
+        params.append(top_n)
 
-    parts = []
-    if hours > 0:
-        parts.append(f"{hours}h")
-    if minutes > 0:
-        parts.append(f"{minutes}m")
-    if secs > 0 or not parts:
-        parts.append(f"{secs}s")
+    query += " ORDER BY day DESC, total_duration_seconds DESC"
 
-    return " ".join(parts)
+    return [
+        {
+            "date": date.fromisoformat(day),
+            "app_name": app,
+            "total_duration_seconds": duration,
+            "day_total_seconds": day_total,
+        }
+        for day, app, duration, day_total in conn.execute(query, params).fetchall()
+    ]
 
 
-def export_csv(data: list[dict], output_path: Path, summary_mode: bool = False):
+def export_csv(data: list, output_path: Path, summary_mode: bool = False):
     """Export data to CSV file."""
     if not data:
         print("No data to export.", file=sys.stderr)
@@ -170,88 +431,79 @@ def export_csv(data: list[dict], output_path: Path, summary_mode: bool = False):
                     "total_duration_formatted": format_duration(row["total_duration_seconds"]),
                 })
         else:
-            fieldnames = ["app_name", "duration_seconds", "start_time", "end_time"]
-            writer = csv.DictWriter(f, fieldnames=fieldnames)
-            writer.writeheader()
-            for row in data:
-                writer.writerow({
-                    "app_name": row["app_name"],
-                    "duration_seconds": row["duration_seconds"],
-                    "start_time": row["start_time"].isoformat() if row["start_time"] else "",
-                    "end_time": row["end_time"].isoformat() if row["end_time"] else "",
-                })
-
-
-def export_json(data: list[dict], output_path: Path, summary_mode: bool = False):
+            writer = csv.writer(f)
+            writer.writerow(["app_name", "duration_seconds", "start_time", "end_time"])
+            writer.writerows(
+                (
+                    app_name,
+                    duration,
+                    start_time.isoformat() if start_time else "",
+                    end_time.isoformat() if end_time else "",
+                )
+                for app_name, duration, start_time, end_time in data
+            )
+
+
+def export_json(data: list, output_path: Path, summary_mode: bool = False):
     """Export data to JSON file."""
-    output_data = []
-
     if summary_mode:
-        for row in data:
-            output_data.append({
+        output_data = [
+            {
                 "app_name": row["app_name"],
                 "total_duration_seconds": row["total_duration_seconds"],
                 "total_duration_formatted": format_duration(row["total_duration_seconds"]),
-            })
+            }
+            for row in data
+        ]
     else:
-        for row in data:
-            output_data.append({
-                "app_name": row["app_name"],
-                "duration_seconds": row["duration_seconds"],
-                "start_time": row["start_time"].isoformat() if row["start_time"] else None,
-                "end_time": row["end_time"].isoformat() if row["end_time"] else None,
-            })
+        # dumps_json serializes the datetimes directly
+        output_data = [
+            {
+                "app_name": app_name,
+                "duration_seconds": duration,
+                "start_time": start_time,
+                "end_time": end_time,
+            }
+            for app_name, duration, start_time, end_time in data
+        ]
 
     with open(output_path, "w", encoding="utf-8") as f:
-        json.dump(output_data, f, indent=2)
+        f.write(dumps_json(output_data))
+
 
+def print_daily_summary(daily_totals: list[dict], top_n: int = 10):
+    """Pretty-print a daily summary showing top apps by usage time.
 
-def print_daily_summary(usage_data: list[dict], top_n: int = 10):
-    """Pretty-print a daily summary showing top apps by usage time."""
-    if not usage_data:
+    Expects rows from get_daily_totals: sorted by date, then duration, descending.
+    """
+    if not daily_totals:
         print("No usage data found for the specified period.")
         return
 
-    # Group by date
-    daily_data = {}
-    for entry in usage_data:
-        if entry["start_time"]:
-            date_key = entry["start_time"].date()
-            if date_key not in daily_data:
-                daily_data[date_key] = {}
-
-            app = entry["app_name"]
-            if app not in daily_data[date_key]:
-                daily_data[date_key][app] = 0
-            daily_data[date_key][app] += entry["duration_seconds"]
+    lines = []
+    for day, rows in groupby(daily_totals, key=lambda x: x["date"]):
+        rows = list(rows)
+        sorted_apps = [(row["app_name"], row["total_duration_seconds"]) for row in rows[:top_n]]
 
-    # Sort dates in descending order
-    sorted_dates = sorted(daily_data.keys(), reverse=True)
+        total_time = rows[0]["day_total_seconds"]
 
-    for date in sorted_dates:
-        apps = daily_data[date]
-        sorted_apps = sorted(apps.items(), key=lambda x: x[1], reverse=True)[:top_n]
-
-        total_time = sum(apps.values())
-
-        print(f"\n{'=' * 60}")
-        print(f"  {date.strftime('%A, %B %d, %Y')}")
-        print(f"  Total Screen Time: {format_duration(total_time)}")
-        print(f"{'=' * 60}")
+        lines.append(f"\n{'=' * 60}")
+        lines.append(f"  {day.strftime('%A, %B %d, %Y')}")
+        lines.append(f"  Total Screen Time: {format_duration(total_time)}")
+        lines.append(f"{'=' * 60}")
 
         if sorted_apps:
-            # Find the longest app name for alignment
-            max_name_len = min(40, max(len(app) for app, _ in sorted_apps))
-
             for i, (app, duration) in enumerate(sorted_apps, 1):
                 # Truncate long app names
                 display_name = app[:40] + "..." if len(app) > 40 else app
                 bar_length = int((duration / sorted_apps[0][1]) * 20) if sorted_apps[0][1] > 0 else 0
-                bar = "█" * bar_length
+                bar = MAX_BAR[:bar_length]
+
+                lines.append(f"  {i:2}. {display_name:<43} {format_duration(duration):>10}  {bar}")
 
-                print(f"  {i:2}. {display_name:<43} {format_duration(duration):>10}  {bar}")
+        lines.append("")
 
-        print()
+    sys.stdout.write("\n".join(lines) + "\n")
 
 
 def parse_date(date_str: str) -> datetime:
@@ -344,35 +596,38 @@ Examples:
         print("  - You may need Full Disk Access permission", file=sys.stderr)
         sys.exit(1)
 
-    # Copy database to temp to avoid locking issues
-    temp_db = None
     try:
-        print("Copying database to avoid lock issues...", file=sys.stderr)
-        temp_db = copy_database_to_temp(args.db)
-
         # Adjust end_date to include the entire day
         end_date = args.end_date
         if end_date:
             end_date = end_date + timedelta(days=1) - timedelta(seconds=1)
 
-        # Fetch data
+        # Fetch data, aggregating inside SQLite when only totals are needed
         print("Reading Screen Time data...", file=sys.stderr)
-        usage_data = get_app_usage(temp_db, args.start_date, end_date)
+        if args.summary:
+            # The terminal view only shows the top apps; exports include all of them
+            limit = None if args.format else args.top
+            data, total_time = read_database(
+                args.db, get_app_totals, args.start_date, end_date, limit
+            )
+        elif args.format:
+            data = read_database(args.db, get_app_usage, args.start_date, end_date)
+        else:
+            data = read_database(args.db, get_daily_totals, args.start_date, end_date, args.top)
 
-        if not usage_data:
+        if not data:
             print("No Screen Time data found for the specified period.", file=sys.stderr)
             sys.exit(0)
 
-        print(f"Found {len(usage_data)} usage records.", file=sys.stderr)
-
-        # Process based on mode
         if args.format:
-            # Export mode
             if args.summary:
-                data = aggregate_by_app(usage_data)
+                print(f"Found usage for {len(data)} apps.", file=sys.stderr)
             else:
-                data = usage_data
+                print(f"Found {len(data)} usage records.", file=sys.stderr)
 
+        # Process based on mode
+        if args.format:
+            # Export mode
             if args.format == "csv":
                 export_csv(data, args.output, args.summary)
             else:
@@ -383,29 +638,26 @@ Examples:
             # Terminal display mode
             if args.summary:
                 # Show overall summary
-                data = aggregate_by_app(usage_data)
-                total_time = sum(d["total_duration_seconds"] for d in data)
-
-                print(f"\n{'=' * 60}")
-                print(f"  Screen Time Summary")
+                lines = [f"\n{'=' * 60}", f"  Screen Time Summary"]
                 if args.start_date:
-                    print(f"  From: {args.start_date.strftime('%Y-%m-%d')}")
+                    lines.append(f"  From: {args.start_date.strftime('%Y-%m-%d')}")
                 if args.end_date:
-                    print(f"  To: {args.end_date.strftime('%Y-%m-%d')}")
-                print(f"  Total Screen Time: {format_duration(total_time)}")
-                print(f"{'=' * 60}")
+                    lines.append(f"  To: {args.end_date.strftime('%Y-%m-%d')}")
+                lines.append(f"  Total Screen Time: {format_duration(total_time)}")
+                lines.append(f"{'=' * 60}")
 
                 for i, entry in enumerate(data[:args.top], 1):
                     app = entry["app_name"]
                     duration = entry["total_duration_seconds"]
                     display_name = app[:40] + "..." if len(app) > 40 else app
                     bar_length = int((duration / data[0]["total_duration_seconds"]) * 20) if data[0]["total_duration_seconds"] > 0 else 0
-                    bar = "█" * bar_length
-                    print(f"  {i:2}. {display_name:<43} {format_duration(duration):>10}  {bar}")
-                print()
+                    bar = MAX_BAR[:bar_length]
+                    lines.append(f"  {i:2}. {display_name:<43} {format_duration(duration):>10}  {bar}")
+                lines.append("")
+                sys.stdout.write("\n".join(lines) + "\n")
             else:
                 # Show daily breakdown
-                print_daily_summary(usage_data, args.top)
+                print_daily_summary(data, args.top)
 
     except PermissionError as e:
         print(f"Error: Permission denied accessing database.", file=sys.stderr)
@@ -423,11 +675,6 @@ Examples:
         print(f"Error: {e}", file=sys.stderr)
         sys.exit(1)
 
-    finally:
-        # Clean up temp database
-        if temp_db and temp_db.exists():
-            shutil.rmtree(temp_db.parent, ignore_errors=True)
-
 
 if __name__ == "__main__":
     main()
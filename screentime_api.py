@@ -9,24 +9,37 @@ Supports two modes:
 Run with: uvicorn screentime_api:app --reload
 """
 
+import asyncio
+import atexit
+import logging
 import os
+import shutil
 import sqlite3
+import tempfile
+import threading
+import time
+import zlib
+from contextlib import asynccontextmanager
 
 from dotenv import load_dotenv
 load_dotenv()
 from datetime import date, datetime, timedelta
 from enum import Enum
+from itertools import groupby, islice
 from pathlib import Path
-from typing import Annotated, Optional
+from typing import Annotated, Iterable, Iterator, Optional
 
-from fastapi import Depends, FastAPI, HTTPException, Query, Security
-from fastapi.responses import StreamingResponse
+from fastapi import Depends, FastAPI, HTTPException, Query, Request, Security
+from fastapi.concurrency import run_in_threadpool
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import JSONResponse, StreamingResponse
 from fastapi.security import APIKeyHeader
 from pydantic import BaseModel, Field
 
 import csv
 import io
-import json
+
+from screentime_format import dumps_json, format_duration
 
 # Server-side storage path (for uploaded data)
 DATA_DIR = Path(os.environ.get("DATA_DIR", "/data"))
@@ -36,48 +49,41 @@ SERVER_DB_PATH = DATA_DIR / "screentime.db"
 try:
     from screentime import (
         DEFAULT_DB_PATH,
+        connect_readonly,
         copy_database_to_temp,
-        get_app_usage,
-        aggregate_by_app,
-        format_duration,
+        create_usage_index,
+        get_app_usage_page,
+        stream_app_usage_rows,
+        get_app_totals,
+        get_daily_totals,
     )
     HAS_LOCAL_DB = True
 except Exception:
     DEFAULT_DB_PATH = Path.home() / "Library/Application Support/Knowledge/knowledgeC.db"
     HAS_LOCAL_DB = False
+    # Still named by the data helpers, which read_local_db never calls here
+    connect_readonly = copy_database_to_temp = create_usage_index = None
+    get_app_usage_page = stream_app_usage_rows = get_app_totals = get_daily_totals = None
 
-    def format_duration(seconds: float) -> str:
-        """Format duration in human-readable format."""
-        if seconds is None or seconds < 0:
-            return "0s"
-        hours = int(seconds // 3600)
-        minutes = int((seconds % 3600) // 60)
-        secs = int(seconds % 60)
-        parts = []
-        if hours > 0:
-            parts.append(f"{hours}h")
-        if minutes > 0:
-            parts.append(f"{minutes}m")
-        if secs > 0 or not parts:
-            parts.append(f"{secs}s")
-        return " ".join(parts)
-
-    def aggregate_by_app(usage_data: list[dict]) -> list[dict]:
-        """Aggregate usage data by app, summing total duration."""
-        app_totals = {}
-        for entry in usage_data:
-            app = entry["app_name"]
-            if app not in app_totals:
-                app_totals[app] = 0
-            app_totals[app] += entry["duration_seconds"]
-        result = [
-            {"app_name": app, "total_duration_seconds": duration}
-            for app, duration in app_totals.items()
-        ]
-        result.sort(key=lambda x: x["total_duration_seconds"], reverse=True)
-        return result
+logger = logging.getLogger(__name__)
 
-import shutil
+# Rows per chunk written to streamed export responses
+EXPORT_BATCH_SIZE = 1000
+
+# Largest database /upload_db accepts, measured after decompression
+MAX_UPLOAD_DB_BYTES = 1024 * 1024 * 1024
+
+# Bytes of a gzipped /upload_db body inflated at a time
+UPLOAD_INFLATE_SIZE = 1024 * 1024
+
+# Seconds between background checks of which databases are present
+DB_STATUS_INTERVAL = 5
+
+# Seconds to cache /summary and /daily results. Ranges ending before today
+# only change on upload; ranges including today grow as sessions are recorded.
+HISTORICAL_CACHE_TTL = 24 * 60 * 60
+RECENT_CACHE_TTL = 60
+AGGREGATE_CACHE_SIZE = 256
 
 # API Key configuration
 API_KEY = os.environ.get("API_KEY")
@@ -104,91 +110,577 @@ async def verify_api_key(api_key: str = Security(api_key_header)) -> str:
     return api_key
 
 
+# Server-side timestamps are whole microseconds since 1970-01-01 of the
+# uploaded wall-clock time. Uploads carry naive Mac local times, which are
+# stored as if they were UTC, so stored values and the calendar dates
+# SQLite derives from them don't depend on the server's timezone. Any UTC
+# offset is dropped rather than applied, keeping the wall-clock time.
+UNIX_EPOCH = datetime(1970, 1, 1)
+
+
+def to_epoch_micros(value: Optional[datetime]) -> Optional[int]:
+    """Convert a datetime's wall-clock time to stored microseconds."""
+    if value is None:
+        return None
+    return (value.replace(tzinfo=None) - UNIX_EPOCH) // timedelta(microseconds=1)
+
+
+def iso_to_micros(value: Optional[str]) -> Optional[int]:
+    """SQL function converting an uploaded ISO 8601 timestamp to stored microseconds.
+
+    Raises ValueError for text that isn't one, failing the statement.
+    """
+    if value is None:
+        return None
+    return to_epoch_micros(datetime.fromisoformat(value))
+
+
+def legacy_iso_to_micros(value) -> Optional[int]:
+    """SQL function converting a legacy stored timestamp, or NULL if it doesn't parse."""
+    try:
+        return iso_to_micros(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def micros_to_iso_sql(column: str) -> str:
+    """SQL expression formatting a stored timestamp column as datetime.isoformat() would."""
+    return f"""(
+        strftime('%Y-%m-%dT%H:%M:%S', {column} / 1000000, 'unixepoch')
+        || CASE WHEN {column} % 1000000 THEN printf('.%06d', {column} % 1000000) ELSE '' END
+    )"""
+
+
 # Server-side database functions
+def connect_server_db(check_same_thread: bool = True) -> sqlite3.Connection:
+    """Open the server-side database tuned for bulk writes and large scans.
+
+    With the WAL journal set by init_server_db, synchronous=NORMAL syncs
+    only at checkpoints rather than on every commit. Sorts and GROUP BY temp
+    tables stay in memory, and pages come from a 64 MiB page cache and a
+    256 MiB memory map.
+    """
+    conn = sqlite3.connect(SERVER_DB_PATH, check_same_thread=check_same_thread)
+    conn.create_function("iso_to_micros", 1, iso_to_micros, deterministic=True)
+    conn.execute("PRAGMA synchronous = NORMAL")
+    conn.execute("PRAGMA temp_store = MEMORY")
+    conn.execute("PRAGMA cache_size = -65536")
+    conn.execute("PRAGMA mmap_size = 268435456")
+    return conn
+
+
+def optimize_server_db(conn: sqlite3.Connection):
+    """Let SQLite refresh any planner statistics that writes have made stale."""
+    try:
+        conn.execute("PRAGMA optimize")
+    except sqlite3.Error:
+        pass  # Best effort; the database may be busy with an upload
+
+
+def close_server_db(conn: sqlite3.Connection):
+    """Close a server database connection, optimizing it first."""
+    try:
+        optimize_server_db(conn)
+    finally:
+        conn.close()
+
+
+# Per-thread connections to the server database, kept open between requests
+_server_conns = threading.local()
+
+
+def get_server_connection() -> sqlite3.Connection:
+    """Return this worker thread's connection to the server database.
+
+    As with get_thread_connection, connections stay open between requests so
+    SQLite's page cache and compiled statements stay warm.
+    """
+    conn = getattr(_server_conns, "conn", None)
+    if conn is None:
+        conn = _server_conns.conn = connect_server_db()
+    return conn
+
+
+USAGE_TABLE_SQL = """
+    CREATE TABLE IF NOT EXISTS {name} (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        app_id INTEGER NOT NULL REFERENCES apps(id),
+        duration_seconds REAL NOT NULL,
+        start_time INTEGER,
+        end_time INTEGER,
+        UNIQUE(app_id, start_time, end_time)
+    )
+"""
+
+
+def migrate_usage_table(conn: sqlite3.Connection):
+    """Bring a usage table from an earlier schema up to USAGE_TABLE_SQL.
+
+    Earlier tables stored app_name text per row, which moves onto the apps
+    table, and ISO 8601 text timestamps, which become stored microseconds.
+    Rebuilds the table in one transaction, keeping record ids.
+    """
+    columns = {row[1]: row[2] for row in conn.execute("PRAGMA table_info(usage)")}
+    has_app_names = "app_name" in columns
+    has_text_times = columns["start_time"] == "TEXT"
+    if not has_app_names and not has_text_times:
+        return
+
+    if has_app_names:
+        app_id, join = "apps.id", "JOIN apps ON apps.name = usage.app_name"
+    else:
+        app_id, join = "usage.app_id", ""
+    if has_text_times:
+        # Earlier versions stored uploaded text unchecked
+        conn.create_function("legacy_iso_to_micros", 1, legacy_iso_to_micros, deterministic=True)
+        times = "legacy_iso_to_micros(start_time), legacy_iso_to_micros(end_time)"
+    else:
+        times = "start_time, end_time"
+
+    conn.execute("BEGIN")
+    try:
+        if has_app_names:
+            conn.execute("INSERT OR IGNORE INTO apps (name) SELECT DISTINCT app_name FROM usage")
+        conn.execute(USAGE_TABLE_SQL.format(name="usage_migrated"))
+        # Text timestamps differing only in form can meet as equal values
+        conn.execute(f"""
+            INSERT OR IGNORE INTO usage_migrated (id, app_id, duration_seconds, start_time, end_time)
+            SELECT usage.id, {app_id}, duration_seconds, {times}
+            FROM usage {join}
+        """)
+        if has_text_times:
+            unparsed = conn.execute("""
+                SELECT COUNT(*) FROM usage JOIN usage_migrated USING (id)
+                WHERE (usage.start_time IS NOT NULL AND usage_migrated.start_time IS NULL)
+                    OR (usage.end_time IS NOT NULL AND usage_migrated.end_time IS NULL)
+            """).fetchone()[0]
+            if unparsed:
+                logger.warning(
+                    "Stored NULL for unparsable timestamps of %d usage records while migrating",
+                    unparsed,
+                )
+        # Dropping the old table drops its indexes too
+        conn.execute("DROP TABLE usage")
+        conn.execute("ALTER TABLE usage_migrated RENAME TO usage")
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    # Hand back the pages of the old table
+    conn.execute("VACUUM")
+
+
 def init_server_db():
     """Initialize the server-side SQLite database."""
     DATA_DIR.mkdir(parents=True, exist_ok=True)
-    conn = sqlite3.connect(SERVER_DB_PATH)
+    conn = connect_server_db()
+    # WAL lets readers run alongside an upload; the setting persists in the file
+    conn.execute("PRAGMA journal_mode = WAL")
+    # App names are stored once here, and referenced from usage by integer id
     conn.execute("""
-        CREATE TABLE IF NOT EXISTS usage (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            app_name TEXT NOT NULL,
-            duration_seconds REAL NOT NULL,
-            start_time TEXT,
-            end_time TEXT,
-            UNIQUE(app_name, start_time, end_time)
+        CREATE TABLE IF NOT EXISTS apps (
+            id INTEGER PRIMARY KEY,
+            name TEXT NOT NULL UNIQUE
         )
     """)
-    conn.execute("CREATE INDEX IF NOT EXISTS idx_start_time ON usage(start_time)")
+    conn.execute(USAGE_TABLE_SQL.format(name="usage"))
+    migrate_usage_table(conn)
+    # Covers the date-range filters and every column the read queries use,
+    # so range scans and GROUP BY app_id never touch the table itself
+    conn.execute("DROP INDEX IF EXISTS idx_start_time")
+    conn.execute("""
+        CREATE INDEX IF NOT EXISTS idx_usage_range
+        ON usage(start_time, end_time, app_id, duration_seconds)
+    """)
     conn.commit()
+    # Refresh planner statistics; analysis_limit bounds the cost per index
+    conn.execute("PRAGMA analysis_limit = 1000")
+    conn.execute("ANALYZE")
     conn.close()
 
 
-def get_server_usage(
+def build_server_usage_filter(
     start_date: Optional[datetime] = None,
     end_date: Optional[datetime] = None
-) -> list[dict]:
-    """Get usage data from server-side database."""
-    if not SERVER_DB_PATH.exists():
-        return []
-
-    conn = sqlite3.connect(SERVER_DB_PATH)
-    conn.row_factory = sqlite3.Row
-
-    query = "SELECT app_name, duration_seconds, start_time, end_time FROM usage WHERE 1=1"
+) -> tuple[str, list]:
+    """Build the WHERE clause and parameters selecting uploaded usage records."""
+    where = " WHERE 1=1"
     params = []
 
     if start_date:
-        query += " AND start_time >= ?"
-        params.append(start_date.isoformat())
+        where += " AND start_time >= ?"
+        params.append(to_epoch_micros(start_date))
 
     if end_date:
-        query += " AND end_time <= ?"
-        params.append(end_date.isoformat())
+        where += " AND end_time <= ?"
+        params.append(to_epoch_micros(end_date))
+
+    return where, params
+
+
+def build_server_usage_query(
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None,
+    limit: Optional[int] = None,
+    before: Optional[tuple[int, int]] = None
+) -> tuple[str, list]:
+    """Build the query selecting uploaded usage records, newest first.
+
+    As with build_app_usage_query, each row ends with its (start_time, id)
+    key, `before` selects the records after a previous page's key, and
+    records without a start time are left out.
+    """
+    where, params = build_server_usage_filter(start_date, end_date)
+    where += " AND usage.start_time IS NOT NULL"
+
+    if before:
+        where += " AND (usage.start_time, usage.id) < (?, ?)"
+        params.extend(before)
+    # CROSS JOIN keeps usage as the outer loop, so rows come off the
+    # covering idx_usage_range in start time order; otherwise the planner
+    # may probe the UNIQUE index per app and sort every row for each page
+    query = f"""
+        SELECT
+            apps.name,
+            duration_seconds,
+            {micros_to_iso_sql("start_time")},
+            {micros_to_iso_sql("end_time")},
+            usage.start_time,
+            usage.id
+        FROM usage CROSS JOIN apps ON apps.id = usage.app_id
+    """ + where + " ORDER BY usage.start_time DESC, usage.id DESC"
+
+    if limit:
+        query += " LIMIT ?"
+        params.append(limit)
+
+    return query, params
 
-    query += " ORDER BY start_time DESC"
+
+def get_server_usage_page(
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None,
+    limit: Optional[int] = None,
+    before: Optional[tuple[int, int]] = None
+) -> tuple[list[tuple], Optional[tuple[int, int]]]:
+    """Get a page of usage data from server-side database.
+
+    Returns (rows, next_key) as get_app_usage_page does. Timestamps are
+    ISO 8601 strings formatted inside SQLite; nothing on the read path
+    parses them. Callers check that the database exists first (see
+    require_server_db).
+    """
+    query, params = build_server_usage_query(start_date, end_date, limit, before)
+    rows = get_server_connection().execute(query, params).fetchall()
+
+    next_key = rows[-1][4:] if limit and len(rows) == limit else None
+    return [row[:4] for row in rows], next_key
+
+
+def build_server_summary_query(
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None,
+    top: Optional[int] = None
+) -> tuple[str, list]:
+    """Build the query summing uploaded usage per app, largest first.
+
+    Each row is (app_name, total_duration_seconds, grand_total), for the
+    top `top` apps when set.
+    """
+    where, params = build_server_usage_filter(start_date, end_date)
+
+    # The window sum is evaluated over every group, before LIMIT applies.
+    # Grouping by +app_id stops the planner from walking the UNIQUE index
+    # for its app_id order, which needs a table lookup per row, in favour
+    # of the covering idx_usage_range. Names are joined on for the top
+    # groups only.
+    query = """
+        SELECT
+            app_id,
+            TOTAL(duration_seconds) as total_duration_seconds,
+            TOTAL(TOTAL(duration_seconds)) OVER () as grand_total
+        FROM usage
+    """ + where + """
+        GROUP BY +app_id
+        ORDER BY total_duration_seconds DESC
+    """
+
+    if top:
+        query += " LIMIT ?"
+        params.append(top)
+
+    query = f"""
+        SELECT apps.name, total_duration_seconds, grand_total
+        FROM ({query}) totals JOIN apps ON apps.id = totals.app_id
+        ORDER BY total_duration_seconds DESC
+    """
+
+    return query, params
+
+
+def get_server_summary(
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None,
+    top: Optional[int] = None
+) -> tuple[list[dict], float]:
+    """Sum uploaded usage per app inside SQLite.
+
+    Returns (apps, grand_total) in the same shape as get_app_totals: the top
+    `top` apps when set, and the total duration across all apps.
+    """
+    query, params = build_server_summary_query(start_date, end_date, top)
+    rows = get_server_connection().execute(query, params).fetchall()
+
+    grand_total = rows[0][2] if rows else 0.0
+    apps = [
+        {"app_name": app, "total_duration_seconds": duration}
+        for app, duration, _ in rows
+    ]
+    return apps, grand_total
+
+
+def build_server_daily_query(
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None,
+    top_apps: Optional[int] = None
+) -> tuple[str, list]:
+    """Build the query summing uploaded usage per day and app, newest day first.
+
+    Each row is (day, app_name, total_duration_seconds, day_total_seconds),
+    for the top `top_apps` apps of each day when set.
+    """
+    where, params = build_server_usage_filter(start_date, end_date)
+
+    # Window functions run after GROUP BY, over each day's per-app totals
+    query = """
+        SELECT day, apps.name, total_duration_seconds, day_total_seconds FROM (
+            SELECT
+                date(start_time / 1000000, 'unixepoch') as day,
+                app_id,
+                TOTAL(duration_seconds) as total_duration_seconds,
+                TOTAL(TOTAL(duration_seconds)) OVER days as day_total_seconds,
+                ROW_NUMBER() OVER (days ORDER BY TOTAL(duration_seconds) DESC) as app_rank
+            FROM usage
+    """ + where + """
+                AND start_time IS NOT NULL
+            GROUP BY day, app_id
+            WINDOW days AS (PARTITION BY date(start_time / 1000000, 'unixepoch'))
+        ) totals JOIN apps ON apps.id = totals.app_id
+    """
+
+    if top_apps:
+        query += " WHERE app_rank <= ?"
+        params.append(top_apps)
+
+    query += " ORDER BY day DESC, total_duration_seconds DESC"
+
+    return query, params
+
+
+def get_server_daily(
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None,
+    top_apps: Optional[int] = None
+) -> list[dict]:
+    """Sum uploaded usage per day and app inside SQLite.
+
+    Returns rows in the same shape as get_daily_totals, keeping the top
+    `top_apps` apps of each day when set. Days are the calendar dates of
+    the uploaded start times.
+    """
+    query, params = build_server_daily_query(start_date, end_date, top_apps)
+    rows = get_server_connection().execute(query, params).fetchall()
+
+    return [
+        {
+            "date": date.fromisoformat(day),
+            "app_name": app,
+            "total_duration_seconds": duration,
+            "day_total_seconds": day_total,
+        }
+        for day, app, duration, day_total in rows
+    ]
+
+
+def stream_server_usage_rows(
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None
+) -> Iterator[tuple]:
+    """Stream (app_name, duration_seconds, start_time, end_time) rows from server-side database.
+
+    Timestamps are returned as ISO 8601 strings formatted inside SQLite.
+    """
+    conn = connect_server_db(check_same_thread=False)
+    query, params = build_server_usage_query(start_date, end_date)
 
     try:
         cursor = conn.execute(query, params)
-        results = []
-        for row in cursor:
-            results.append({
-                "app_name": row["app_name"],
-                "duration_seconds": row["duration_seconds"],
-                "start_time": datetime.fromisoformat(row["start_time"]) if row["start_time"] else None,
-                "end_time": datetime.fromisoformat(row["end_time"]) if row["end_time"] else None,
-            })
-        return results
+        for batch in iter(lambda: cursor.fetchmany(EXPORT_BATCH_SIZE), []):
+            for row in batch:
+                yield row[:4]
     finally:
-        conn.close()
+        close_server_db(conn)
+
+
+def copy_usage_rows(conn: sqlite3.Connection, source: str, text_times: bool = False) -> int:
+    """Insert the rows of `source`, a table of (app_name, duration_seconds,
+    start_time, end_time), into usage, adding any new apps.
 
+    Timestamps are stored microseconds, or ISO 8601 text with `text_times`,
+    in which case text that doesn't parse fails the copy. Records already
+    stored are skipped. Runs in the caller's transaction. Returns the
+    number of new records.
+    """
+    if text_times:
+        times = "iso_to_micros(start_time), iso_to_micros(end_time)"
+    else:
+        times = "start_time, end_time"
+
+    # WHERE true keeps the parser from reading ON CONFLICT as a join constraint
+    conn.execute(f"""
+        INSERT INTO apps (name) SELECT DISTINCT app_name FROM {source} WHERE true
+        ON CONFLICT (name) DO NOTHING
+    """)
+    cursor = conn.execute(f"""
+        INSERT INTO usage (app_id, duration_seconds, start_time, end_time)
+        SELECT apps.id, duration_seconds, {times}
+        FROM {source} JOIN apps ON apps.name = {source}.app_name WHERE true
+        ON CONFLICT (app_id, start_time, end_time) DO NOTHING
+    """)
+    return cursor.rowcount
 
-def insert_usage_records(records: list[dict]) -> int:
-    """Insert usage records into server database. Returns count of new records."""
+
+def insert_usage_records(records: Iterable[tuple]) -> int:
+    """Insert (app_name, duration_seconds, start_time, end_time) records into server database.
+
+    Timestamps are datetimes. Returns count of new records.
+    """
     init_server_db()
-    conn = sqlite3.connect(SERVER_DB_PATH)
+    conn = get_server_connection()
 
-    inserted = 0
-    for record in records:
+    # Records are staged in an in-memory temp table, then resolved to app
+    # ids and copied in two set-based statements
+    conn.execute("""
+        CREATE TEMP TABLE IF NOT EXISTS upload_usage (
+            app_name TEXT, duration_seconds REAL, start_time INTEGER, end_time INTEGER
+        )
+    """)
+    records = (
+        (app_name, duration, to_epoch_micros(start_time), to_epoch_micros(end_time))
+        for app_name, duration, start_time, end_time in records
+    )
+    # One transaction for the whole batch
+    with conn:
+        conn.execute("DELETE FROM temp.upload_usage")
+        conn.executemany("INSERT INTO temp.upload_usage VALUES (?, ?, ?, ?)", records)
+        inserted = copy_usage_rows(conn, "temp.upload_usage")
+        conn.execute("DELETE FROM temp.upload_usage")
+
+    if inserted:
+        optimize_server_db(conn)
+        invalidate_aggregate_cache()
+    return inserted
+
+
+class CompactJSONResponse(JSONResponse):
+    """JSON response rendered with dumps_json (orjson when installed)."""
+
+    def render(self, content) -> bytes:
+        return dumps_json(content).encode("utf-8")
+
+
+def insert_usage_db(upload_path: Path) -> tuple[int, int]:
+    """Copy the usage table of an uploaded SQLite database into the server database.
+
+    The upload's usage table has app_name, duration_seconds, start_time and
+    end_time columns with ISO 8601 timestamps, so rows are copied inside
+    SQLite; only the timestamp conversion calls back into Python. Returns (records received, new records).
+    """
+    init_server_db()
+    conn = get_server_connection()
+
+    conn.execute("ATTACH DATABASE ? AS upload", (str(upload_path),))
+    try:
+        received = conn.execute("SELECT COUNT(*) FROM upload.usage").fetchone()[0]
+        with conn:
+            inserted = copy_usage_rows(conn, "upload.usage", text_times=True)
+    finally:
+        conn.execute("DETACH DATABASE upload")
+
+    if inserted:
+        optimize_server_db(conn)
+        invalidate_aggregate_cache()
+    return received, inserted
+
+
+class UploadTooLargeError(Exception):
+    """An /upload_db body would inflate past MAX_UPLOAD_DB_BYTES."""
+
+
+def write_upload_chunk(f, decompressor, chunk: bytes):
+    """Append a chunk of an /upload_db body to f, gunzipping it when decompressor is set.
+
+    Gzipped chunks are inflated UPLOAD_INFLATE_SIZE bytes at a time, so a
+    small body that inflates to gigabytes is never held in memory. Raises
+    UploadTooLargeError rather than grow f past MAX_UPLOAD_DB_BYTES.
+    """
+    if decompressor is None:
+        if f.tell() + len(chunk) > MAX_UPLOAD_DB_BYTES:
+            raise UploadTooLargeError
+        f.write(chunk)
+        return
+
+    while True:
+        data = decompressor.decompress(chunk, UPLOAD_INFLATE_SIZE)
+        if f.tell() + len(data) > MAX_UPLOAD_DB_BYTES:
+            raise UploadTooLargeError
+        f.write(data)
+        chunk = decompressor.unconsumed_tail
+        # A full buffer can leave output pending after the input is used up
+        if not chunk and len(data) < UPLOAD_INFLATE_SIZE:
+            return
+
+
+def probe_db_status() -> dict:
+    """Check which databases exist, for requests to read instead of stat()ing."""
+    return {
+        "local_exists": HAS_LOCAL_DB and DEFAULT_DB_PATH.exists(),
+        "server_exists": SERVER_DB_PATH.exists(),
+    }
+
+
+# Held while replacing app.state.db_status or updating it after an upload,
+# so a probe that started before an upload can't undo its update
+_db_status_lock = threading.Lock()
+
+
+async def watch_db_status(app: FastAPI):
+    """Refresh app.state.db_status every DB_STATUS_INTERVAL seconds."""
+    while True:
+        await asyncio.sleep(DB_STATUS_INTERVAL)
         try:
-            conn.execute(
-                """INSERT OR IGNORE INTO usage (app_name, duration_seconds, start_time, end_time)
-                   VALUES (?, ?, ?, ?)""",
-                (
-                    record["app_name"],
-                    record["duration_seconds"],
-                    record["start_time"],
-                    record["end_time"],
-                )
-            )
-            if conn.total_changes > inserted:
-                inserted = conn.total_changes
-        except sqlite3.IntegrityError:
-            pass  # Duplicate record, skip
+            with _db_status_lock:
+                app.state.db_status = probe_db_status()
+        except OSError:
+            pass  # e.g. a stat() denied by macOS privacy controls; keep the last status
 
-    conn.commit()
-    conn.close()
-    return inserted
+
+def mark_server_db_created():
+    """Record that an upload created the server database, without waiting for the probe."""
+    with _db_status_lock:
+        app.state.db_status["server_exists"] = True
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Probe the databases at startup and keep the result fresh in the background."""
+    app.state.db_status = probe_db_status()
+    if app.state.db_status["server_exists"]:
+        # Bring an existing database up to the current schema before serving reads
+        init_server_db()
+    watcher = asyncio.create_task(watch_db_status(app))
+    yield
+    watcher.cancel()
 
 
 app = FastAPI(
@@ -200,8 +692,14 @@ API for extracting and analyzing macOS Screen Time data from knowledgeC.db.
 Grant access in System Preferences > Privacy & Security > Full Disk Access.
     """,
     version="1.0.0",
+    lifespan=lifespan,
+    default_response_class=CompactJSONResponse,
 )
 
+# Usage data is highly repetitive text; compress anything over 1 KiB,
+# including streamed exports, for clients that accept gzip
+app.add_middleware(GZipMiddleware, minimum_size=1024)
+
 
 class OutputFormat(str, Enum):
     json = "json"
@@ -211,7 +709,7 @@ class OutputFormat(str, Enum):
 class UsageRecord(BaseModel):
     app_name: str
     duration_seconds: float
-    duration_formatted: str
+    duration_formatted: Optional[str] = None
     start_time: Optional[datetime]
     end_time: Optional[datetime]
 
@@ -219,7 +717,7 @@ class UsageRecord(BaseModel):
 class AppSummary(BaseModel):
     app_name: str
     total_duration_seconds: float
-    total_duration_formatted: str
+    total_duration_formatted: Optional[str] = None
 
 
 class DailyBreakdown(BaseModel):
@@ -233,6 +731,7 @@ class UsageResponse(BaseModel):
     record_count: int
     start_date: Optional[date]
     end_date: Optional[date]
+    next_cursor: Optional[str] = None
     records: list[UsageRecord]
 
 
@@ -263,8 +762,8 @@ class HealthResponse(BaseModel):
 class UploadRecord(BaseModel):
     app_name: str
     duration_seconds: float
-    start_time: Optional[str] = None
-    end_time: Optional[str] = None
+    start_time: Optional[datetime] = None
+    end_time: Optional[datetime] = None
 
 
 class UploadRequest(BaseModel):
@@ -277,66 +776,353 @@ class UploadResponse(BaseModel):
     records_inserted: int
 
 
-def get_usage_data(start_date: Optional[date], end_date: Optional[date]) -> list[dict]:
-    """Fetch usage data with proper error handling.
-
-    Tries local macOS database first, falls back to server-side storage.
-    """
+def to_datetime_range(
+    start_date: Optional[date], end_date: Optional[date]
+) -> tuple[Optional[datetime], Optional[datetime]]:
+    """Expand inclusive query dates to datetimes covering whole days."""
     start_dt = datetime.combine(start_date, datetime.min.time()) if start_date else None
     end_dt = datetime.combine(end_date, datetime.max.time()) if end_date else None
+    return start_dt, end_dt
+
+
+# Temp copy of the local database, reused until the source database changes
+_cached_db: Optional[tuple[Path, tuple]] = None
+_cached_db_lock = threading.Lock()
+
+
+def get_db_signature(db_path: Path) -> tuple:
+    """Return (mtime_ns, size) of the database and its WAL file.
+
+    Writes to a WAL-mode database may only touch the -wal file, so both are
+    needed to tell whether a cached copy is stale.
+    """
+    signature = []
+    for path in (db_path, db_path.parent / (db_path.name + "-wal")):
+        try:
+            st = path.stat()
+            signature.append((st.st_mtime_ns, st.st_size))
+        except FileNotFoundError:
+            signature.append(None)
+    return tuple(signature)
+
+
+def get_readable_db() -> Path:
+    """Return a temp copy of the local database, re-copying only when it changed."""
+    global _cached_db
+
+    with _cached_db_lock:
+        signature = get_db_signature(DEFAULT_DB_PATH)
+        if _cached_db and _cached_db[1] == signature:
+            return _cached_db[0]
+
+        stale = _cached_db
+        temp_db = copy_database_to_temp(DEFAULT_DB_PATH)
+        # Built once per copy, then reused by every request until it's stale
+        create_usage_index(temp_db)
+        _cached_db = (temp_db, signature)
+
+    if stale:
+        shutil.rmtree(stale[0].parent, ignore_errors=True)
+    return temp_db
+
+
+@atexit.register
+def cleanup_cached_db():
+    """Remove the cached temp copy of the local database on shutdown."""
+    if _cached_db:
+        shutil.rmtree(_cached_db[0].parent, ignore_errors=True)
+
+
+# Per-thread read-only connections to the local database, kept open between requests
+_thread_conns = threading.local()
 
-    # Try local macOS database first (if available and on macOS)
-    if HAS_LOCAL_DB and DEFAULT_DB_PATH.exists():
-        temp_db = None
+
+def get_thread_connection(db_path: Path) -> sqlite3.Connection:
+    """Return this worker thread's read-only connection to db_path.
+
+    Connections stay open between requests, so SQLite's page cache and
+    compiled statements stay warm. A thread keeps at most one connection to a
+    cached copy; the one to a superseded copy is closed when a new copy is
+    first used.
+    """
+    conns = _thread_conns.__dict__.setdefault("by_path", {})
+    conn = conns.get(db_path)
+    if conn is None:
+        if db_path != DEFAULT_DB_PATH:
+            for stale_path in [path for path in conns if path != DEFAULT_DB_PATH]:
+                conns.pop(stale_path).close()
+        conn = conns[db_path] = connect_readonly(db_path)
+    return conn
+
+
+def read_local_db(read_fn):
+    """Call read_fn(db_path) on the local macOS database.
+
+    Retries on a cached copy when the live file is locked. Returns None when
+    the local database is unavailable or unreadable, so callers can fall back
+    to server-side storage.
+    """
+    if not app.state.db_status["local_exists"]:
+        return None
+
+    try:
         try:
-            temp_db = copy_database_to_temp(DEFAULT_DB_PATH)
-            return get_app_usage(temp_db, start_dt, end_dt)
-        except PermissionError:
-            raise HTTPException(
-                status_code=403,
-                detail={
-                    "error": "Permission denied",
-                    "hint": "Grant Full Disk Access to the process running this API.",
-                }
-            )
-        except Exception as e:
-            # Fall through to try server database
-            pass
-        finally:
-            if temp_db and temp_db.exists():
-                shutil.rmtree(temp_db.parent, ignore_errors=True)
-
-    # Fallback to server-side database (for cloud deployment)
-    if SERVER_DB_PATH.exists():
-        return get_server_usage(start_dt, end_dt)
-
-    raise HTTPException(
-        status_code=503,
-        detail={
-            "error": "No data available",
-            "hint": "Either run on macOS with Screen Time enabled, or upload data using POST /upload",
-        }
-    )
+            return read_fn(DEFAULT_DB_PATH)
+        except sqlite3.OperationalError:
+            # The system holds a lock on the live file; read a cached copy
+            return read_fn(get_readable_db())
+    except PermissionError:
+        raise HTTPException(
+            status_code=403,
+            detail={
+                "error": "Permission denied",
+                "hint": "Grant Full Disk Access to the process running this API.",
+            }
+        )
+    except Exception as e:
+        # Fall through to try server database
+        return None
+
+
+def query_local_db(query_fn, *args):
+    """Run a screentime query function, query_fn(conn, *args), on this thread's local database connection."""
+    return read_local_db(lambda db_path: query_fn(get_thread_connection(db_path), *args))
+
+
+def stream_local_usage_rows(
+    db_path: Path, start_dt: Optional[datetime], end_dt: Optional[datetime]
+) -> Iterator[tuple]:
+    """Stream usage rows from the local database over a dedicated connection.
+
+    Streaming responses advance the generator from arbitrary threadpool
+    threads, so it can't borrow a per-thread connection. The connection is
+    closed once the rows are exhausted.
+    """
+    conn = connect_readonly(db_path, check_same_thread=False)
+    try:
+        rows = stream_app_usage_rows(conn, start_dt, end_dt)
+    except Exception:
+        conn.close()
+        raise
+    return close_when_exhausted(conn, rows)
+
+
+def close_when_exhausted(conn: sqlite3.Connection, rows: Iterator[tuple]) -> Iterator[tuple]:
+    """Yield rows, then close the connection they are read from."""
+    try:
+        yield from rows
+    finally:
+        conn.close()
+
+
+def require_server_db():
+    """Fail with 503 if no data has been uploaded to the server yet."""
+    if not app.state.db_status["server_exists"]:
+        raise HTTPException(
+            status_code=503,
+            detail={
+                "error": "No data available",
+                "hint": "Either run on macOS with Screen Time enabled, or upload data using POST /upload",
+            }
+        )
+
+
+def get_server_data(
+    start_dt: Optional[datetime],
+    end_dt: Optional[datetime],
+    limit: Optional[int] = None,
+    before: Optional[tuple] = None,
+) -> tuple[list[tuple], Optional[tuple]]:
+    """Fetch a page of uploaded usage data, or fail if nothing has been uploaded."""
+    require_server_db()
+    return get_server_usage_page(start_dt, end_dt, limit, before)
+
+
+def encode_cursor(key: Optional[tuple]) -> Optional[str]:
+    """Render a (start, id) page key as an opaque /usage cursor."""
+    if key is None:
+        return None
+    start, row_id = key
+    return f"{start!r}|{row_id}"
+
+
+def decode_cursor(cursor: Optional[str]) -> Optional[tuple]:
+    """Parse a /usage cursor back into its (start, id) page key."""
+    if cursor is None:
+        return None
+    try:
+        start, row_id = cursor.split("|")
+        # Local start times are REAL, server ones INTEGER microseconds
+        return (float(start) if "." in start else int(start)), int(row_id)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor.")
+
+
+def get_usage_data(
+    start_date: Optional[date],
+    end_date: Optional[date],
+    limit: Optional[int] = None,
+    before: Optional[tuple] = None,
+) -> tuple[list[tuple], Optional[tuple]]:
+    """Fetch a page of usage data with proper error handling.
+
+    Tries local macOS database first, falls back to server-side storage.
+    Returns (rows, next_key) as get_app_usage_page does. Timestamps are
+    datetimes from the local database and ISO 8601 strings from server-side
+    storage; both serialize to the same JSON.
+    """
+    start_dt, end_dt = to_datetime_range(start_date, end_date)
+
+    page = query_local_db(get_app_usage_page, start_dt, end_dt, limit, before)
+    if page is None:
+        page = get_server_data(start_dt, end_dt, limit, before)
+    return page
+
+
+def get_usage_rows(start_date: Optional[date], end_date: Optional[date]) -> Iterator[tuple]:
+    """Stream usage rows as (app_name, duration_seconds, start_time, end_time) tuples.
+
+    Timestamps are ISO 8601 strings. Rows come straight from the database
+    cursor, for exports that format each row once and never need dicts.
+    """
+    start_dt, end_dt = to_datetime_range(start_date, end_date)
+
+    rows = read_local_db(lambda db_path: stream_local_usage_rows(db_path, start_dt, end_dt))
+    if rows is None:
+        require_server_db()
+        rows = stream_server_usage_rows(start_dt, end_dt)
+    return rows
+
+
+def get_app_totals_data(
+    start_date: Optional[date], end_date: Optional[date], top: Optional[int] = None
+) -> tuple[list[dict], float]:
+    """Fetch per-app usage totals for the top apps, aggregated in SQLite.
+
+    Returns (apps, grand_total), where grand_total covers all apps, not just the top ones.
+    """
+    start_dt, end_dt = to_datetime_range(start_date, end_date)
+
+    result = query_local_db(get_app_totals, start_dt, end_dt, top)
+    if result is None:
+        require_server_db()
+        result = get_server_summary(start_dt, end_dt, top)
+    return result
+
+
+def get_daily_totals_data(
+    start_date: Optional[date], end_date: Optional[date], top_apps: Optional[int] = None
+) -> list[dict]:
+    """Fetch per-day, per-app usage totals for each day's top apps, aggregated in SQLite."""
+    start_dt, end_dt = to_datetime_range(start_date, end_date)
+
+    daily_totals = query_local_db(get_daily_totals, start_dt, end_dt, top_apps)
+    if daily_totals is None:
+        require_server_db()
+        daily_totals = get_server_daily(start_dt, end_dt, top_apps)
+    return daily_totals
+
+
+# Aggregated results by (fetch function, arguments, data version), each with its expiry time
+_aggregate_cache: dict[tuple, tuple[float, object]] = {}
+_aggregate_cache_lock = threading.Lock()
+_data_version = 0
+
+
+def invalidate_aggregate_cache():
+    """Expire every cached aggregate, after an upload changed the data."""
+    global _data_version
+
+    with _aggregate_cache_lock:
+        _data_version += 1
+        _aggregate_cache.clear()
+
+
+def cached_aggregate(fetch_fn, start_date: Optional[date], end_date: Optional[date], *args):
+    """Return fetch_fn(start_date, end_date, *args), reusing a recent result.
+
+    Results for ranges that end before today are kept for
+    HISTORICAL_CACHE_TTL, others for RECENT_CACHE_TTL. Uploads bump the data
+    version, so a result computed before an upload is never served after it.
+    """
+    key = (fetch_fn, start_date, end_date, args, _data_version)
+    now = time.monotonic()
+
+    with _aggregate_cache_lock:
+        entry = _aggregate_cache.get(key)
+    if entry and entry[0] > now:
+        return entry[1]
+
+    result = fetch_fn(start_date, end_date, *args)
+
+    ttl = HISTORICAL_CACHE_TTL if end_date and end_date < date.today() else RECENT_CACHE_TTL
+    with _aggregate_cache_lock:
+        _aggregate_cache.pop(key, None)
+        _aggregate_cache[key] = (now + ttl, result)
+        # Entries are kept in insertion order, so evict the oldest first
+        while len(_aggregate_cache) > AGGREGATE_CACHE_SIZE:
+            del _aggregate_cache[next(iter(_aggregate_cache))]
+    return result
+
+
+def add_formatted_durations(rows: list[dict], seconds_key: str, formatted_key: str):
+    """Add a human-readable copy of each row's duration, e.g. "1h 5m 3s"."""
+    for row in rows:
+        row[formatted_key] = format_duration(row[seconds_key])
+
+
+def iter_csv(fieldnames: list[str], rows):
+    """Yield CSV text a batch of rows at a time, the header leading the first batch.
+
+    Each chunk is large enough for the gzip middleware to compress well.
+    None values are written as empty fields.
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(fieldnames)
+
+    rows = iter(rows)
+    while batch := list(islice(rows, EXPORT_BATCH_SIZE)):
+        writer.writerows(batch)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+
+    if buffer.tell():
+        yield buffer.getvalue()  # Header only; there were no rows
+
+
+def iter_json_array(records):
+    """Yield a compact JSON array a batch of records at a time."""
+    batch = ["["]
+    separator = ""
+    for record in records:
+        batch.append(separator + dumps_json(record))
+        separator = ","
+        if len(batch) == EXPORT_BATCH_SIZE:
+            yield "".join(batch)
+            batch.clear()
+
+    yield "".join(batch) + "]"
 
 
 @app.get("/health", response_model=HealthResponse, tags=["System"])
 def health_check():
     """Check API health and database availability."""
+    db_status = app.state.db_status
     record_count = 0
-    if SERVER_DB_PATH.exists():
+    if db_status["server_exists"]:
         try:
-            conn = sqlite3.connect(SERVER_DB_PATH)
-            cursor = conn.execute("SELECT COUNT(*) FROM usage")
+            cursor = get_server_connection().execute("SELECT COUNT(*) FROM usage")
             record_count = cursor.fetchone()[0]
-            conn.close()
         except Exception:
             pass
 
     return HealthResponse(
         status="ok",
-        database_exists=DEFAULT_DB_PATH.exists(),
+        database_exists=db_status["local_exists"],
         database_path=str(DEFAULT_DB_PATH),
-        server_db_exists=SERVER_DB_PATH.exists(),
+        server_db_exists=db_status["server_exists"],
         server_db_path=str(SERVER_DB_PATH),
         record_count=record_count,
     )
@@ -353,153 +1139,211 @@ def upload_usage_data(
     Use this endpoint to sync data from your Mac to the cloud server.
     Duplicate records (same app, start_time, end_time) are automatically skipped.
     """
-    records = [
-        {
-            "app_name": r.app_name,
-            "duration_seconds": r.duration_seconds,
-            "start_time": r.start_time,
-            "end_time": r.end_time,
-        }
+    # Bound straight from the models; executemany consumes the generator lazily
+    inserted = insert_usage_records(
+        (r.app_name, r.duration_seconds, r.start_time, r.end_time)
         for r in request.records
-    ]
+    )
+    mark_server_db_created()
+
+    return UploadResponse(
+        status="ok",
+        records_received=len(request.records),
+        records_inserted=inserted,
+    )
 
-    inserted = insert_usage_records(records)
+
+@app.post("/upload_db", response_model=UploadResponse, tags=["Upload"])
+async def upload_usage_db(
+    request: Request,
+    _: str = Depends(verify_api_key),
+):
+    """
+    Upload Screen Time usage records as a SQLite database file.
+
+    The request body is a SQLite database with a `usage` table of app_name,
+    duration_seconds, start_time and end_time, as written by
+    `sync_screentime.py --upload-db`, optionally sent with
+    `Content-Encoding: gzip`. Duplicate records are skipped, as with /upload.
+    Databases over 1 GiB, uncompressed, are rejected with 413.
+    """
+    # File I/O and decompression run in the threadpool, off the event loop
+    temp_dir = Path(await run_in_threadpool(tempfile.mkdtemp, prefix="screentime_upload_"))
+    upload_path = temp_dir / "upload.db"
+
+    try:
+        # wbits=31 reads the gzip container
+        decompressor = (
+            zlib.decompressobj(wbits=31)
+            if request.headers.get("content-encoding") == "gzip"
+            else None
+        )
+        f = await run_in_threadpool(open, upload_path, "wb")
+        try:
+            async for chunk in request.stream():
+                await run_in_threadpool(write_upload_chunk, f, decompressor, chunk)
+        finally:
+            await run_in_threadpool(f.close)
+        if decompressor and not decompressor.eof:
+            raise zlib.error("gzip stream ended early")
+
+        received, inserted = await run_in_threadpool(insert_usage_db, upload_path)
+    except UploadTooLargeError:
+        raise HTTPException(
+            status_code=413,
+            detail={
+                "error": "Database upload too large",
+                "hint": f"Uploaded databases are limited to {MAX_UPLOAD_DB_BYTES} bytes uncompressed; sync fewer days at a time",
+            }
+        )
+    except (zlib.error, sqlite3.DatabaseError) as e:
+        raise HTTPException(
+            status_code=400,
+            detail={
+                "error": "Invalid database upload",
+                "hint": f"Expected a SQLite database with a usage table of ISO 8601 timestamps ({e})",
+            }
+        )
+    finally:
+        await run_in_threadpool(shutil.rmtree, temp_dir, ignore_errors=True)
+
+    mark_server_db_created()
 
     return UploadResponse(
         status="ok",
-        records_received=len(records),
+        records_received=received,
         records_inserted=inserted,
     )
 
 
-@app.get("/usage", response_model=UsageResponse, tags=["Usage Data"])
+# The read endpoints below return CompactJSONResponse directly: their dicts
+# already match the documented models, so FastAPI skips per-row validation
+# and jsonable_encoder.
+@app.get(
+    "/usage",
+    response_model=None,
+    responses={200: {"model": UsageResponse}},
+    tags=["Usage Data"],
+)
 def get_usage(
     _: str = Depends(verify_api_key),
     start_date: Optional[date] = Query(None, description="Filter from this date (inclusive)"),
     end_date: Optional[date] = Query(None, description="Filter until this date (inclusive)"),
     limit: Optional[int] = Query(None, ge=1, le=10000, description="Limit number of records returned"),
+    cursor: Optional[str] = Query(None, description="Return the page after this one (a previous page's next_cursor)"),
+    include_formatted: bool = Query(True, description="Include human-readable durations"),
 ):
     """
     Get detailed app usage records.
 
     Returns individual usage sessions with app name, duration, and timestamps.
+    When `limit` is set and the page is full, `next_cursor` marks its last
+    session; pass it as `cursor` to get the next page. Sessions without a
+    start time are not listed.
     """
-    usage_data = get_usage_data(start_date, end_date)
+    usage_data, next_key = get_usage_data(start_date, end_date, limit, decode_cursor(cursor))
 
     records = [
-        UsageRecord(
-            app_name=r["app_name"],
-            duration_seconds=r["duration_seconds"],
-            duration_formatted=format_duration(r["duration_seconds"]),
-            start_time=r["start_time"],
-            end_time=r["end_time"],
-        )
-        for r in usage_data
+        {
+            "app_name": app_name,
+            "duration_seconds": duration,
+            "start_time": start_time,
+            "end_time": end_time,
+        }
+        for app_name, duration, start_time, end_time in usage_data
     ]
-
-    if limit:
-        records = records[:limit]
-
-    return UsageResponse(
-        record_count=len(records),
-        start_date=start_date,
-        end_date=end_date,
-        records=records,
-    )
-
-
-@app.get("/summary", response_model=SummaryResponse, tags=["Usage Data"])
+    if include_formatted:
+        add_formatted_durations(records, "duration_seconds", "duration_formatted")
+
+    return CompactJSONResponse({
+        "record_count": len(records),
+        "start_date": start_date,
+        "end_date": end_date,
+        "next_cursor": encode_cursor(next_key),
+        "records": records,
+    })
+
+
+@app.get(
+    "/summary",
+    response_model=None,
+    responses={200: {"model": SummaryResponse}},
+    tags=["Usage Data"],
+)
 def get_summary(
     _: str = Depends(verify_api_key),
     start_date: Optional[date] = Query(None, description="Filter from this date (inclusive)"),
     end_date: Optional[date] = Query(None, description="Filter until this date (inclusive)"),
     top: Optional[int] = Query(None, ge=1, le=1000, description="Limit to top N apps by usage"),
+    include_formatted: bool = Query(True, description="Include human-readable durations"),
 ):
     """
     Get aggregated usage summary by app.
 
     Returns total usage time per app, sorted by duration descending.
     """
-    usage_data = get_usage_data(start_date, end_date)
-    aggregated = aggregate_by_app(usage_data)
-
-    if top:
-        aggregated = aggregated[:top]
-
-    total_seconds = sum(a["total_duration_seconds"] for a in aggregated)
-
-    apps = [
-        AppSummary(
-            app_name=a["app_name"],
-            total_duration_seconds=a["total_duration_seconds"],
-            total_duration_formatted=format_duration(a["total_duration_seconds"]),
-        )
-        for a in aggregated
-    ]
-
-    return SummaryResponse(
-        total_duration_seconds=total_seconds,
-        total_duration_formatted=format_duration(total_seconds),
-        start_date=start_date,
-        end_date=end_date,
-        app_count=len(apps),
-        apps=apps,
-    )
-
-
-@app.get("/daily", response_model=DailyResponse, tags=["Usage Data"])
+    aggregated, total_seconds = cached_aggregate(get_app_totals_data, start_date, end_date, top)
+
+    # Copies, so the cached aggregate is never modified
+    apps = [dict(a) for a in aggregated]
+    if include_formatted:
+        add_formatted_durations(apps, "total_duration_seconds", "total_duration_formatted")
+
+    return CompactJSONResponse({
+        "total_duration_seconds": total_seconds,
+        "total_duration_formatted": format_duration(total_seconds),
+        "start_date": start_date,
+        "end_date": end_date,
+        "app_count": len(apps),
+        "apps": apps,
+    })
+
+
+@app.get(
+    "/daily",
+    response_model=None,
+    responses={200: {"model": DailyResponse}},
+    tags=["Usage Data"],
+)
 def get_daily_breakdown(
     _: str = Depends(verify_api_key),
     start_date: Optional[date] = Query(None, description="Filter from this date (inclusive)"),
     end_date: Optional[date] = Query(None, description="Filter until this date (inclusive)"),
     top_apps: int = Query(10, ge=1, le=100, description="Number of top apps per day"),
+    include_formatted: bool = Query(True, description="Include human-readable durations"),
 ):
     """
     Get daily usage breakdown.
 
     Returns usage grouped by day with top apps for each day.
     """
-    usage_data = get_usage_data(start_date, end_date)
+    daily_totals = cached_aggregate(get_daily_totals_data, start_date, end_date, top_apps)
 
-    # Group by date
-    daily_data: dict[date, dict[str, float]] = {}
-    for entry in usage_data:
-        if entry["start_time"]:
-            date_key = entry["start_time"].date()
-            if date_key not in daily_data:
-                daily_data[date_key] = {}
+    # Build response; rows arrive sorted by date, then duration, descending
+    days = []
+    for day, rows in groupby(daily_totals, key=lambda x: x["date"]):
+        rows = list(rows)
+        total_seconds = rows[0]["day_total_seconds"]
 
-            app = entry["app_name"]
-            if app not in daily_data[date_key]:
-                daily_data[date_key][app] = 0
-            daily_data[date_key][app] += entry["duration_seconds"]
+        apps = [
+            {"app_name": row["app_name"], "total_duration_seconds": row["total_duration_seconds"]}
+            for row in rows
+        ]
+        if include_formatted:
+            add_formatted_durations(apps, "total_duration_seconds", "total_duration_formatted")
 
-    # Build response
-    days = []
-    for day in sorted(daily_data.keys(), reverse=True):
-        apps_dict = daily_data[day]
-        sorted_apps = sorted(apps_dict.items(), key=lambda x: x[1], reverse=True)[:top_apps]
-        total_seconds = sum(apps_dict.values())
-
-        days.append(DailyBreakdown(
-            date=day,
-            total_duration_seconds=total_seconds,
-            total_duration_formatted=format_duration(total_seconds),
-            apps=[
-                AppSummary(
-                    app_name=app,
-                    total_duration_seconds=duration,
-                    total_duration_formatted=format_duration(duration),
-                )
-                for app, duration in sorted_apps
-            ],
-        ))
-
-    return DailyResponse(
-        start_date=start_date,
-        end_date=end_date,
-        days=days,
-    )
+        days.append({
+            "date": day,
+            "total_duration_seconds": total_seconds,
+            "total_duration_formatted": format_duration(total_seconds),
+            "apps": apps,
+        })
+
+    return CompactJSONResponse({
+        "start_date": start_date,
+        "end_date": end_date,
+        "days": days,
+    })
 
 
 @app.get("/export", tags=["Export"])
@@ -509,17 +1353,17 @@ def export_data(
     start_date: Optional[date] = Query(None, description="Filter from this date (inclusive)"),
     end_date: Optional[date] = Query(None, description="Filter until this date (inclusive)"),
     summary: bool = Query(False, description="Export aggregated summary instead of detailed records"),
+    include_formatted: bool = Query(True, description="Include human-readable durations in summary exports"),
 ):
     """
     Export usage data as CSV or JSON file download.
     """
-    usage_data = get_usage_data(start_date, end_date)
-
     if summary:
-        data = aggregate_by_app(usage_data)
+        data, _ = get_app_totals_data(start_date, end_date)
         filename = "screentime_summary"
     else:
-        data = usage_data
+        # Stream rows from the cursor straight into the writer
+        rows = get_usage_rows(start_date, end_date)
         filename = "screentime_usage"
 
     if start_date:
@@ -528,58 +1372,54 @@ def export_data(
         filename += f"_to_{end_date}"
 
     if format == OutputFormat.csv:
-        output = io.StringIO()
-
-        if summary:
-            writer = csv.DictWriter(output, fieldnames=["app_name", "total_duration_seconds", "total_duration_formatted"])
-            writer.writeheader()
-            for row in data:
-                writer.writerow({
-                    "app_name": row["app_name"],
-                    "total_duration_seconds": row["total_duration_seconds"],
-                    "total_duration_formatted": format_duration(row["total_duration_seconds"]),
-                })
+        if summary and include_formatted:
+            fieldnames = ["app_name", "total_duration_seconds", "total_duration_formatted"]
+            rows = (
+                (
+                    row["app_name"],
+                    row["total_duration_seconds"],
+                    format_duration(row["total_duration_seconds"]),
+                )
+                for row in data
+            )
+        elif summary:
+            fieldnames = ["app_name", "total_duration_seconds"]
+            rows = ((row["app_name"], row["total_duration_seconds"]) for row in data)
         else:
-            writer = csv.DictWriter(output, fieldnames=["app_name", "duration_seconds", "start_time", "end_time"])
-            writer.writeheader()
-            for row in data:
-                writer.writerow({
-                    "app_name": row["app_name"],
-                    "duration_seconds": row["duration_seconds"],
-                    "start_time": row["start_time"].isoformat() if row["start_time"] else "",
-                    "end_time": row["end_time"].isoformat() if row["end_time"] else "",
-                })
+            fieldnames = ["app_name", "duration_seconds", "start_time", "end_time"]
 
-        output.seek(0)
         return StreamingResponse(
-            iter([output.getvalue()]),
+            iter_csv(fieldnames, rows),
             media_type="text/csv",
             headers={"Content-Disposition": f"attachment; filename={filename}.csv"},
         )
 
     else:  # JSON
-        if summary:
-            output_data = [
+        if summary and not include_formatted:
+            # Already in the exported shape
+            records = data
+        elif summary:
+            records = (
                 {
                     "app_name": row["app_name"],
                     "total_duration_seconds": row["total_duration_seconds"],
                     "total_duration_formatted": format_duration(row["total_duration_seconds"]),
                 }
                 for row in data
-            ]
+            )
         else:
-            output_data = [
+            records = (
                 {
-                    "app_name": row["app_name"],
-                    "duration_seconds": row["duration_seconds"],
-                    "start_time": row["start_time"].isoformat() if row["start_time"] else None,
-                    "end_time": row["end_time"].isoformat() if row["end_time"] else None,
+                    "app_name": app_name,
+                    "duration_seconds": duration,
+                    "start_time": start_time,
+                    "end_time": end_time,
                 }
-                for row in data
-            ]
+                for app_name, duration, start_time, end_time in rows
+            )
 
         return StreamingResponse(
-            iter([json.dumps(output_data, indent=2)]),
+            iter_json_array(records),
             media_type="application/json",
             headers={"Content-Disposition": f"attachment; filename={filename}.json"},
         )
@@ -0,0 +1,55 @@
+"""
+JSON and duration formatting shared by the Screen Time CLI and API.
+
+Kept apart from screentime.py so the API can use it on hosts where the
+knowledgeC.db helpers can't be imported.
+"""
+
+import json
+from datetime import date, datetime
+from functools import lru_cache
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def json_default(obj):
+    """Serialize dates and datetimes as ISO 8601 for the stdlib json encoder."""
+    if isinstance(obj, (date, datetime)):
+        return obj.isoformat()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def dumps_json(obj) -> str:
+    """Serialize to compact JSON, using orjson when it is installed."""
+    if orjson is not None:
+        return orjson.dumps(obj).decode("utf-8")
+    return json.dumps(obj, separators=(",", ":"), default=json_default)
+
+
+@lru_cache(maxsize=8192)
+def format_whole_seconds(total_seconds: int) -> str:
+    """Format a non-negative whole number of seconds, e.g. "1h 5m 3s"."""
+    hours, remainder = divmod(total_seconds, 3600)
+    minutes, secs = divmod(remainder, 60)
+
+    parts = []
+    if hours > 0:
+        parts.append(f"{hours}h")
+    if minutes > 0:
+        parts.append(f"{minutes}m")
+    if secs > 0 or not parts:
+        parts.append(f"{secs}s")
+
+    return " ".join(parts)
+
+
+def format_duration(seconds: float) -> str:
+    """Format duration in human-readable format."""
+    if seconds is None or seconds < 0:
+        return "0s"
+
+    # Session lengths repeat heavily once truncated, so the cache absorbs most calls
+    return format_whole_seconds(int(seconds))
@@ -15,6 +15,7 @@ Configuration:
 """
 
 import argparse
+import gzip
 import json
 import os
 import shutil
@@ -32,6 +33,9 @@ APPLE_EPOCH_OFFSET = 978307200
 # Default database location
 DEFAULT_DB_PATH = Path.home() / "Library/Application Support/Knowledge/knowledgeC.db"
 
+# Records sent per POST to /upload
+UPLOAD_BATCH_SIZE = 1000
+
 # Config file location
 CONFIG_PATH = Path.home() / ".config/screentime-sync/config.json"
 
@@ -58,14 +62,21 @@ def copy_database_to_temp(db_path: Path) -> Path:
 
     for suffix in ["-wal", "-shm"]:
         wal_file = db_path.parent / (db_path.name + suffix)
-        if wal_file.exists():
+        try:
             shutil.copy2(wal_file, temp_db.parent / (temp_db.name + suffix))
+        except FileNotFoundError:
+            pass
 
     return temp_db
 
 
 def get_usage_data(db_path: Path, days_back: int = 7) -> list[dict]:
-    """Extract recent app usage data from knowledgeC.db."""
+    """Read recent app usage records from knowledgeC.db.
+
+    Every row is fetched and the connection closed before this returns, so
+    lock errors surface to the caller, and no read transaction on the live
+    database is held open while records are uploaded.
+    """
     start_date = datetime.now() - timedelta(days=days_back)
 
     query = """
@@ -81,29 +92,92 @@ def get_usage_data(db_path: Path, days_back: int = 7) -> list[dict]:
         ORDER BY ZSTARTDATE DESC
     """
 
-    conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
-    conn.row_factory = sqlite3.Row
+    # No busy wait; the caller retries on a copy when the file is locked
+    conn = sqlite3.connect(f"{db_path.absolute().as_uri()}?mode=ro", uri=True, timeout=0)
 
     try:
-        cursor = conn.execute(query, [datetime_to_apple_time(start_date)])
-        results = []
+        rows = conn.execute(query, [datetime_to_apple_time(start_date)]).fetchall()
+    finally:
+        conn.close()
+
+    records = []
+    # Positional unpacking; sqlite3.Row would look up each column by name
+    for app_name, duration, start_timestamp, end_timestamp in rows:
+        start_time = apple_time_to_datetime(start_timestamp)
+        end_time = apple_time_to_datetime(end_timestamp)
+
+        records.append({
+            "app_name": app_name,
+            "duration_seconds": duration or 0,
+            "start_time": start_time.isoformat() if start_time else None,
+            "end_time": end_time.isoformat() if end_time else None,
+        })
+    return records
 
-        for row in cursor:
-            start_time = apple_time_to_datetime(row["start_timestamp"])
-            end_time = apple_time_to_datetime(row["end_timestamp"])
 
-            results.append({
-                "app_name": row["app_name"],
-                "duration_seconds": row["duration_seconds"] or 0,
-                "start_time": start_time.isoformat() if start_time else None,
-                "end_time": end_time.isoformat() if end_time else None,
-            })
+def export_usage_db(db_path: Path, export_path: Path, days_back: int = 7) -> int:
+    """Write recent app usage records to a new SQLite database for /upload_db.
 
-        return results
+    The export has a single usage table in the server's format, with
+    timestamps as local-time ISO 8601 strings exactly as get_usage_data
+    produces them, so the server copies rows without converting them.
+    Returns the number of records written.
+    """
+    start_date = datetime.now() - timedelta(days=days_back)
+
+    export_path.unlink(missing_ok=True)
+    # No busy wait on the attached knowledgeC.db; see get_usage_data
+    conn = sqlite3.connect(export_path.absolute().as_uri(), uri=True, timeout=0)
+
+    try:
+        conn.create_function(
+            "apple_time_to_iso",
+            1,
+            lambda ts: apple_time_to_datetime(ts).isoformat() if ts is not None else None,
+            deterministic=True,
+        )
+        conn.execute(
+            "ATTACH DATABASE ? AS knowledge",
+            (f"{db_path.absolute().as_uri()}?mode=ro",),
+        )
+        conn.execute("""
+            CREATE TABLE usage (
+                app_name TEXT NOT NULL,
+                duration_seconds REAL NOT NULL,
+                start_time TEXT,
+                end_time TEXT
+            )
+        """)
+        with conn:
+            cursor = conn.execute("""
+                INSERT INTO usage (app_name, duration_seconds, start_time, end_time)
+                SELECT
+                    ZVALUESTRING,
+                    COALESCE(ZENDDATE - ZSTARTDATE, 0),
+                    apple_time_to_iso(ZSTARTDATE),
+                    apple_time_to_iso(ZENDDATE)
+                FROM knowledge.ZOBJECT
+                WHERE ZSTREAMNAME = '/app/usage'
+                    AND ZVALUESTRING IS NOT NULL
+                    AND ZSTARTDATE >= ?
+            """, [datetime_to_apple_time(start_date)])
+        return cursor.rowcount
     finally:
         conn.close()
 
 
+def send_request(req: urllib.request.Request) -> dict:
+    """Send a request to the server and return its JSON response."""
+    try:
+        with urllib.request.urlopen(req, timeout=30) as response:
+            return json.loads(response.read().decode("utf-8"))
+    except urllib.error.HTTPError as e:
+        error_body = e.read().decode("utf-8")
+        raise Exception(f"HTTP {e.code}: {error_body}")
+    except urllib.error.URLError as e:
+        raise Exception(f"Connection failed: {e.reason}")
+
+
 def upload_data(api_url: str, api_key: str, records: list[dict]) -> dict:
     """Upload usage records to the server."""
     url = api_url.rstrip("/") + "/upload"
@@ -119,15 +193,26 @@ def upload_data(api_url: str, api_key: str, records: list[dict]) -> dict:
         },
         method="POST",
     )
+    return send_request(req)
 
-    try:
-        with urllib.request.urlopen(req, timeout=30) as response:
-            return json.loads(response.read().decode("utf-8"))
-    except urllib.error.HTTPError as e:
-        error_body = e.read().decode("utf-8")
-        raise Exception(f"HTTP {e.code}: {error_body}")
-    except urllib.error.URLError as e:
-        raise Exception(f"Connection failed: {e.reason}")
+
+def upload_db(api_url: str, api_key: str, export_path: Path) -> dict:
+    """Upload an exported usage database to the server, gzip-compressed."""
+    url = api_url.rstrip("/") + "/upload_db"
+
+    data = gzip.compress(export_path.read_bytes())
+
+    req = urllib.request.Request(
+        url,
+        data=data,
+        headers={
+            "Content-Type": "application/octet-stream",
+            "Content-Encoding": "gzip",
+            "X-API-Key": api_key,
+        },
+        method="POST",
+    )
+    return send_request(req)
 
 
 def load_config() -> dict:
@@ -174,6 +259,13 @@ Examples:
         help="Number of days to sync (default: 7)",
     )
 
+    parser.add_argument(
+        "--upload-db",
+        action="store_true",
+        help="Upload the records as one compressed SQLite file instead of JSON batches "
+             "(needs a server with the /upload_db endpoint)",
+    )
+
     parser.add_argument(
         "--save",
         action="store_true",
@@ -225,28 +317,54 @@ Examples:
         print("Make sure Screen Time is enabled on this Mac.", file=sys.stderr)
         sys.exit(1)
 
-    # Copy and read database
+    # Read database in place, copying it only if the system holds a lock on it
     temp_db = None
+    export_dir = None
     try:
         if not args.quiet:
             print("Reading Screen Time data...")
 
-        temp_db = copy_database_to_temp(DEFAULT_DB_PATH)
-        records = get_usage_data(temp_db, args.days)
-
-        if not records:
+        found = inserted = 0
+        if args.upload_db:
+            export_dir = Path(tempfile.mkdtemp(prefix="screentime_sync_"))
+            export_path = export_dir / "usage.db"
+
+            try:
+                found = export_usage_db(DEFAULT_DB_PATH, export_path, args.days)
+            except sqlite3.OperationalError:
+                temp_db = copy_database_to_temp(DEFAULT_DB_PATH)
+                found = export_usage_db(temp_db, export_path, args.days)
+
+            if found:
+                if not args.quiet:
+                    print(f"Uploading to {api_url}...")
+                inserted = upload_db(api_url, api_key, export_path)["records_inserted"]
+        else:
+            try:
+                records = get_usage_data(DEFAULT_DB_PATH, args.days)
+            except sqlite3.OperationalError:
+                temp_db = copy_database_to_temp(DEFAULT_DB_PATH)
+                records = get_usage_data(temp_db, args.days)
+
+            found = len(records)
+            if found and not args.quiet:
+                print(f"Uploading to {api_url}...")
+
+            # Upload in batches rather than as one large POST. The server
+            # skips records it already has, so re-running after a failed
+            # batch is safe.
+            for i in range(0, found, UPLOAD_BATCH_SIZE):
+                result = upload_data(api_url, api_key, records[i:i + UPLOAD_BATCH_SIZE])
+                inserted += result["records_inserted"]
+
+        if not found:
             if not args.quiet:
                 print("No usage data found for the specified period.")
             sys.exit(0)
 
         if not args.quiet:
-            print(f"Found {len(records)} records from the last {args.days} days")
-            print(f"Uploading to {api_url}...")
-
-        result = upload_data(api_url, api_key, records)
-
-        if not args.quiet:
-            print(f"Sync complete: {result['records_inserted']} new records uploaded")
+            print(f"Found {found} records from the last {args.days} days")
+            print(f"Sync complete: {inserted} new records uploaded")
 
     except PermissionError:
         print("Error: Permission denied. Grant Full Disk Access to your terminal.", file=sys.stderr)
@@ -258,8 +376,10 @@ Examples:
         sys.exit(1)
 
     finally:
-        if temp_db and temp_db.exists():
+        if temp_db:
             shutil.rmtree(temp_db.parent, ignore_errors=True)
+        if export_dir:
+            shutil.rmtree(export_dir, ignore_errors=True)
 
 
 if __name__ == "__main__":
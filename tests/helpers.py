@@ -0,0 +1,127 @@
+"""Shared fixtures for the tests."""
+
+import shutil
+import sqlite3
+import tempfile
+import threading
+import unittest
+from datetime import datetime
+from pathlib import Path
+from unittest import mock
+
+from fastapi.testclient import TestClient
+
+import screentime_api
+from screentime import APPLE_EPOCH_OFFSET
+
+API_KEY = "test-key"
+
+
+def apple_time(value: datetime) -> float:
+    """A local time as knowledgeC.db stores it: seconds since 2001-01-01 UTC."""
+    return value.timestamp() - APPLE_EPOCH_OFFSET
+
+
+def create_knowledge_db(db_path: Path, sessions: list[tuple] = None):
+    """Write a minimal knowledgeC.db: the ZOBJECT columns the queries use.
+
+    `sessions` are (app_name, ZSTARTDATE, ZENDDATE) rows; by default, 500
+    sessions of a few apps. Rows from another stream are added alongside.
+    """
+    if sessions is None:
+        start = 790000000.0
+        sessions = [
+            (f"com.example.app{i % 7}", start + i * 60, start + i * 60 + 30)
+            for i in range(500)
+        ]
+
+    conn = sqlite3.connect(db_path)
+    conn.execute("""
+        CREATE TABLE ZOBJECT (
+            Z_PK INTEGER PRIMARY KEY,
+            ZSTREAMNAME VARCHAR,
+            ZVALUESTRING VARCHAR,
+            ZSTARTDATE TIMESTAMP,
+            ZENDDATE TIMESTAMP
+        )
+    """)
+    rows = []
+    for app_name, start, end in sessions:
+        rows.append(("/app/usage", app_name, start, end))
+        rows.append(("/display/isBacklit", None, start, end))
+    conn.executemany(
+        "INSERT INTO ZOBJECT (ZSTREAMNAME, ZVALUESTRING, ZSTARTDATE, ZENDDATE) VALUES (?, ?, ?, ?)",
+        rows,
+    )
+    conn.commit()
+    conn.close()
+
+
+def create_upload_db(db_path: Path, records: list[dict]):
+    """Write a /upload_db body: a usage table of the given /upload records."""
+    conn = sqlite3.connect(db_path)
+    conn.execute("""
+        CREATE TABLE usage (
+            app_name TEXT NOT NULL,
+            duration_seconds REAL NOT NULL,
+            start_time TEXT,
+            end_time TEXT
+        )
+    """)
+    conn.executemany(
+        "INSERT INTO usage VALUES (:app_name, :duration_seconds, :start_time, :end_time)",
+        records,
+    )
+    conn.commit()
+    conn.close()
+
+
+class ApiTestCase(unittest.TestCase):
+    """Runs the API against databases in a temp directory.
+
+    The server database starts out missing, as does the local knowledgeC.db
+    at self.local_db_path unless a test creates it before start_client().
+    """
+
+    api = screentime_api
+
+    def setUp(self):
+        self.temp_dir = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, self.temp_dir, ignore_errors=True)
+        self.local_db_path = self.temp_dir / "knowledgeC.db"
+        data_dir = self.temp_dir / "data"
+
+        for name, value in [
+            ("API_KEY", API_KEY),
+            ("DATA_DIR", data_dir),
+            ("SERVER_DB_PATH", data_dir / "screentime.db"),
+            ("DEFAULT_DB_PATH", self.local_db_path),
+            # Fresh per-thread connection pools, so no test reuses another's
+            ("_server_conns", threading.local()),
+            ("_thread_conns", threading.local()),
+        ]:
+            patch = mock.patch.object(self.api, name, value)
+            patch.start()
+            self.addCleanup(patch.stop)
+
+        self.api.invalidate_aggregate_cache()
+        self.addCleanup(self.api.invalidate_aggregate_cache)
+
+    def start_client(self) -> TestClient:
+        """Start the app, probing for databases as at server startup."""
+        self.client = self.enterContext(TestClient(self.api.app, headers={"X-API-Key": API_KEY}))
+        return self.client
+
+    def upload(self, records: list[dict]) -> dict:
+        response = self.client.post("/upload", json={"records": records})
+        self.assertEqual(response.status_code, 200, response.text)
+        return response.json()
+
+    def upload_db(self, records: list[dict]) -> dict:
+        """Upload records through /upload_db, as a SQLite database."""
+        db_path = self.temp_dir / "upload.db"
+        create_upload_db(db_path, records)
+        response = self.client.post("/upload_db", content=db_path.read_bytes())
+        db_path.unlink()
+        self.assertEqual(response.status_code, 200, response.text)
+        return response.json()
@@ -0,0 +1,47 @@
+"""Tests for the knowledgeC.db queries in screentime.py."""
+
+import shutil
+import sqlite3
+import tempfile
+import unittest
+from datetime import datetime
+from pathlib import Path
+
+from screentime import build_app_usage_query, create_usage_index
+from tests.helpers import create_knowledge_db
+
+
+class UsageIndexTest(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = Path(tempfile.mkdtemp())
+        self.db_path = self.temp_dir / "knowledgeC.db"
+        create_knowledge_db(self.db_path)
+        create_usage_index(self.db_path)
+        self.conn = sqlite3.connect(self.db_path)
+
+    def tearDown(self):
+        self.conn.close()
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+    def query_plan(self, query: str, params: list) -> list[str]:
+        return [row[3] for row in self.conn.execute("EXPLAIN QUERY PLAN " + query, params)]
+
+    def test_usage_query_is_served_from_covering_index(self):
+        cases = [
+            {},
+            {"start_date": datetime(2026, 1, 1), "end_date": datetime(2026, 1, 31)},
+            {"limit": 50, "before": (790010000.0, 100)},
+        ]
+        for kwargs in cases:
+            with self.subTest(**kwargs):
+                plan = self.query_plan(*build_app_usage_query(**kwargs))
+                self.assertTrue(
+                    plan[0].startswith("SEARCH ZOBJECT USING COVERING INDEX ix_app_usage"),
+                    plan,
+                )
+                # Only sessions sharing a start time are sorted (by Z_PK)
+                self.assertNotIn("USE TEMP B-TREE FOR ORDER BY", plan)
+
+
+if __name__ == "__main__":
+    unittest.main()
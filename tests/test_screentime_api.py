@@ -0,0 +1,459 @@
+"""Tests for the server-side storage in screentime_api.py."""
+
+import gzip
+import importlib
+import json
+import shutil
+import sqlite3
+import sys
+import tempfile
+import unittest
+from datetime import date, datetime, timedelta
+from pathlib import Path
+from unittest import mock
+
+import screentime_api
+from screentime_api import (
+    build_server_daily_query,
+    build_server_summary_query,
+    build_server_usage_query,
+    get_server_daily,
+    get_server_usage_page,
+    init_server_db,
+    insert_usage_records,
+)
+from sync_screentime import export_usage_db, get_usage_data
+from tests.helpers import ApiTestCase, create_knowledge_db, create_upload_db
+from tests.test_sync_screentime import recent_sessions
+
+# The usage table as the first server version created it
+BASELINE_SCHEMA = """
+    CREATE TABLE usage (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        app_name TEXT NOT NULL,
+        duration_seconds REAL NOT NULL,
+        start_time TEXT,
+        end_time TEXT,
+        UNIQUE(app_name, start_time, end_time)
+    );
+    CREATE INDEX idx_start_time ON usage(start_time);
+"""
+
+BASELINE_ROWS = [
+    ("Safari", 30.5, "2026-01-05T09:00:00.250000", "2026-01-05T09:00:30.750000"),
+    ("Mail", 60.0, "2026-01-05T09:05:00", "2026-01-05T09:06:00"),
+    ("Safari", 120.0, "2026-01-06T23:59:00", "2026-01-07T00:01:00"),
+    ("Mail", 5.0, "2026-01-06T10:00:00", None),
+    ("Notes", 1.0, "not a timestamp", None),
+]
+
+
+class MigrateUsageTableTest(unittest.TestCase):
+    def setUp(self):
+        self.data_dir = Path(tempfile.mkdtemp())
+        db_path = self.data_dir / "screentime.db"
+        patches = [
+            mock.patch.object(screentime_api, "DATA_DIR", self.data_dir),
+            mock.patch.object(screentime_api, "SERVER_DB_PATH", db_path),
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+
+        conn = sqlite3.connect(db_path)
+        conn.executescript(BASELINE_SCHEMA)
+        conn.executemany(
+            "INSERT INTO usage (app_name, duration_seconds, start_time, end_time) VALUES (?, ?, ?, ?)",
+            BASELINE_ROWS,
+        )
+        conn.commit()
+        conn.close()
+        self.conn = sqlite3.connect(db_path)
+
+    def tearDown(self):
+        self.conn.close()
+        server_conn = getattr(screentime_api._server_conns, "conn", None)
+        if server_conn is not None:
+            server_conn.close()
+            del screentime_api._server_conns.conn
+        shutil.rmtree(self.data_dir, ignore_errors=True)
+
+    def test_migrates_baseline_schema(self):
+        with self.assertLogs(screentime_api.logger, "WARNING") as logs:
+            init_server_db()
+        self.assertIn("1 usage records", logs.output[0])
+
+        columns = {row[1]: row[2] for row in self.conn.execute("PRAGMA table_info(usage)")}
+        self.assertEqual(columns, {
+            "id": "INTEGER",
+            "app_id": "INTEGER",
+            "duration_seconds": "REAL",
+            "start_time": "INTEGER",
+            "end_time": "INTEGER",
+        })
+        indexes = {row[1] for row in self.conn.execute("PRAGMA index_list(usage)")}
+        self.assertIn("idx_usage_range", indexes)
+        self.assertNotIn("idx_start_time", indexes)
+        apps = {row[0] for row in self.conn.execute("SELECT name FROM apps")}
+        self.assertEqual(apps, {"Safari", "Mail", "Notes"})
+
+        # Record ids are kept; timestamps read back as they were uploaded
+        rows = self.conn.execute("""
+            SELECT usage.id, apps.name, duration_seconds, start_time, end_time
+            FROM usage JOIN apps ON apps.id = usage.app_id ORDER BY usage.id
+        """).fetchall()
+        self.assertEqual([row[:3] for row in rows], [
+            (i, name, duration) for i, (name, duration, _, _) in enumerate(BASELINE_ROWS, 1)
+        ])
+        self.assertEqual(rows[-1][3:], (None, None))
+
+        usage, _ = get_server_usage_page()
+        self.assertEqual(sorted(usage), sorted(BASELINE_ROWS[:-1]))
+
+        daily = get_server_daily()
+        self.assertEqual(
+            [(row["date"], row["app_name"]) for row in daily],
+            [(date(2026, 1, 6), "Safari"), (date(2026, 1, 6), "Mail"),
+             (date(2026, 1, 5), "Mail"), (date(2026, 1, 5), "Safari")],
+        )
+
+    def test_migration_runs_once(self):
+        with self.assertLogs(screentime_api.logger, "WARNING"):
+            init_server_db()
+        before = self.conn.execute("SELECT * FROM usage ORDER BY id").fetchall()
+
+        init_server_db()
+        after = self.conn.execute("SELECT * FROM usage ORDER BY id").fetchall()
+        self.assertEqual(before, after)
+
+
+class ServerUsageIndexTest(ApiTestCase):
+    """The server-side counterpart of test_screentime.UsageIndexTest."""
+
+    def setUp(self):
+        super().setUp()
+        start = datetime(2026, 1, 1)
+        insert_usage_records(
+            (f"app{i % 7}", 30.0, start + timedelta(minutes=i), start + timedelta(minutes=i, seconds=30))
+            for i in range(5000)
+        )
+        # Statistics as init_server_db leaves them for a populated database
+        init_server_db()
+        self.conn = screentime_api.get_server_connection()
+
+    def query_plan(self, query: str, params: list) -> list[str]:
+        return [row[3] for row in self.conn.execute("EXPLAIN QUERY PLAN " + query, params)]
+
+    def test_ranged_queries_are_served_from_covering_index(self):
+        date_range = {"start_date": datetime(2026, 1, 2), "end_date": datetime(2026, 1, 3)}
+        cases = [
+            (build_server_summary_query, date_range),
+            (build_server_summary_query, {**date_range, "top": 3}),
+            (build_server_daily_query, date_range),
+            (build_server_daily_query, {**date_range, "top_apps": 3}),
+            (build_server_usage_query, {"limit": 50, "before": (1767300000000000, 100)}),
+            (build_server_usage_query, {**date_range, "limit": 50}),
+        ]
+        for build_query, kwargs in cases:
+            with self.subTest(build_query.__name__, **kwargs):
+                plan = self.query_plan(*build_query(**kwargs))
+                usage_scans = [step for step in plan if "usage" in step.split()[1:2]]
+                self.assertEqual(len(usage_scans), 1, plan)
+                self.assertIn("USING COVERING INDEX idx_usage_range", usage_scans[0])
+
+
+class SummaryTotalTest(ApiTestCase):
+    """/summary totals every app, however many are listed."""
+
+    def assert_total_ignores_top(self, expected_total: float):
+        totals = {}
+        for top in [None, 1, 2]:
+            response = self.client.get("/summary", params={"top": top} if top else {})
+            self.assertEqual(response.status_code, 200, response.text)
+            summary = response.json()
+            self.assertEqual(summary["app_count"], top or 7)
+            totals[top] = summary["total_duration_seconds"]
+        self.assertEqual(totals, dict.fromkeys(totals, expected_total))
+
+    def test_local_total(self):
+        create_knowledge_db(self.local_db_path)  # 500 sessions of 30s over 7 apps
+        self.start_client()
+        self.assert_total_ignores_top(500 * 30.0)
+
+    def test_uploaded_total(self):
+        self.start_client()
+        self.upload([
+            {"app_name": f"app{i % 7}", "duration_seconds": 10.0 + i,
+             "start_time": f"2026-01-05T09:{i:02d}:00", "end_time": f"2026-01-05T09:{i:02d}:30"}
+            for i in range(21)
+        ])
+        self.assert_total_ignores_top(sum(10.0 + i for i in range(21)))
+
+
+def usage_record(app_name: str, start_time: str, duration_seconds: float = 30.0) -> dict:
+    """An /upload record of a session starting at start_time."""
+    start = datetime.fromisoformat(start_time)
+    return {
+        "app_name": app_name,
+        "duration_seconds": duration_seconds,
+        "start_time": start_time,
+        "end_time": (start + timedelta(seconds=duration_seconds)).isoformat(),
+    }
+
+
+class AggregateCacheTest(ApiTestCase):
+    def get_total(self, **params) -> float:
+        response = self.client.get("/summary", params=params)
+        self.assertEqual(response.status_code, 200, response.text)
+        return response.json()["total_duration_seconds"]
+
+    def test_uploads_expire_historical_totals(self):
+        self.start_client()
+        self.upload([usage_record("Safari", "2026-01-05T09:00:00")])
+        self.assertEqual(self.get_total(end_date="2026-01-06"), 30.0)
+
+        # A past range is cached for a day; writes the API doesn't see don't show up
+        with screentime_api.get_server_connection() as conn:
+            conn.execute("UPDATE usage SET duration_seconds = 1000")
+        self.assertEqual(self.get_total(end_date="2026-01-06"), 30.0)
+
+        self.upload([usage_record("Mail", "2026-01-05T10:00:00", 60.0)])
+        self.assertEqual(self.get_total(end_date="2026-01-06"), 1060.0)
+
+        self.upload_db([usage_record("Notes", "2026-01-05T11:00:00", 5.0)])
+        self.assertEqual(self.get_total(end_date="2026-01-06"), 1065.0)
+
+    def test_cache_keeps_newest_entries(self):
+        self.start_client()
+        self.upload([usage_record(f"app{i}", f"2026-01-05T09:0{i}:00") for i in range(6)])
+
+        with mock.patch.object(screentime_api, "AGGREGATE_CACHE_SIZE", 3):
+            for top in [1, 2, 3, 4, 5]:
+                self.get_total(top=top)
+            self.assertEqual([key[3] for key in screentime_api._aggregate_cache], [(3,), (4,), (5,)])
+
+            # Entries leave in the order they were added, however recently they were hit
+            self.get_total(top=3)
+            self.get_total(top=1)
+            self.assertEqual([key[3] for key in screentime_api._aggregate_cache], [(4,), (5,), (1,)])
+
+
+class UploadDbTest(ApiTestCase):
+    def setUp(self):
+        super().setUp()
+        self.start_client()
+        self.db_path = self.temp_dir / "upload.db"
+
+    def post_db(self, body: bytes, gzipped: bool = False):
+        headers = {"Content-Encoding": "gzip"} if gzipped else {}
+        return self.client.post("/upload_db", content=body, headers=headers)
+
+    def record_count(self) -> int:
+        return self.client.get("/health").json()["record_count"]
+
+    def test_plain_and_gzipped_uploads(self):
+        records = [usage_record(f"app{i % 3}", f"2026-01-05T09:{i:02d}:00.500000") for i in range(20)]
+        # Small inflate steps, so each chunk of the gzipped body takes several
+        with mock.patch.object(screentime_api, "UPLOAD_INFLATE_SIZE", 1000):
+            for gzipped, batch in [(False, records[:10]), (True, records[10:])]:
+                with self.subTest(gzipped=gzipped):
+                    self.db_path.unlink(missing_ok=True)
+                    create_upload_db(self.db_path, batch)
+                    body = self.db_path.read_bytes()
+                    response = self.post_db(gzip.compress(body) if gzipped else body, gzipped)
+                    self.assertEqual(response.status_code, 200, response.text)
+                    self.assertEqual(response.json()["records_inserted"], 10)
+
+        uploaded = self.client.get("/usage").json()["records"]
+        self.assertEqual(
+            sorted((r["app_name"], r["start_time"], r["end_time"]) for r in uploaded),
+            sorted((r["app_name"], r["start_time"], r["end_time"]) for r in records),
+        )
+
+    def test_skips_records_sent_to_upload(self):
+        knowledge_db = self.temp_dir / "knowledgeC.db"
+        # Only finished sessions: a NULL end_time never conflicts in the UNIQUE constraint
+        sessions = [session for session in recent_sessions(datetime.now()) if session[2] is not None]
+        create_knowledge_db(knowledge_db, sessions)
+        records = get_usage_data(knowledge_db)
+        self.assertEqual(self.upload(records)["records_inserted"], len(records))
+
+        count = export_usage_db(knowledge_db, self.db_path)
+        response = self.post_db(gzip.compress(self.db_path.read_bytes()), gzipped=True)
+        self.assertEqual(response.status_code, 200, response.text)
+        self.assertEqual(response.json(), {
+            "status": "ok", "records_received": count, "records_inserted": 0,
+        })
+        self.assertEqual(self.record_count(), len(records))
+
+    def test_rejects_invalid_body(self):
+        create_upload_db(self.db_path, [usage_record("Safari", "2026-01-05T09:00:00")])
+        body = self.db_path.read_bytes()
+        cases = {
+            "not a database": (b"not a database" * 100, False),
+            "not gzip": (body, True),
+            "truncated gzip": (gzip.compress(body)[:-100], True),
+        }
+        for name, (content, gzipped) in cases.items():
+            with self.subTest(name):
+                response = self.post_db(content, gzipped)
+                self.assertEqual(response.status_code, 400, response.text)
+                self.assertEqual(response.json()["detail"]["error"], "Invalid database upload")
+
+    def test_rejects_unparsable_timestamp(self):
+        records = [usage_record("Safari", "2026-01-05T09:00:00"), usage_record("Mail", "2026-01-05T10:00:00")]
+        records[1]["end_time"] = "yesterday"
+        create_upload_db(self.db_path, records)
+
+        response = self.post_db(self.db_path.read_bytes())
+        self.assertEqual(response.status_code, 400, response.text)
+        self.assertEqual(self.record_count(), 0)  # Nothing from the upload is kept
+
+    def test_rejects_oversized_upload(self):
+        create_upload_db(self.db_path, [usage_record("Safari", "2026-01-05T09:00:00")])
+        body = self.db_path.read_bytes()
+        max_bytes = len(body) - 1
+        cases = {
+            "plain": (body, False),
+            "gzipped": (gzip.compress(body), True),
+            # Inflates to far more than one inflate buffer
+            "gzip bomb": (gzip.compress(bytes(50 * 1024 * 1024)), True),
+        }
+        with mock.patch.object(screentime_api, "MAX_UPLOAD_DB_BYTES", max_bytes):
+            for name, (content, gzipped) in cases.items():
+                with self.subTest(name):
+                    response = self.post_db(content, gzipped)
+                    self.assertEqual(response.status_code, 413, response.text)
+            self.assertEqual(self.record_count(), 0)
+
+        # Exactly at the limit is fine
+        with mock.patch.object(screentime_api, "MAX_UPLOAD_DB_BYTES", len(body)):
+            response = self.post_db(gzip.compress(body), gzipped=True)
+            self.assertEqual(response.status_code, 200, response.text)
+
+
+def import_api_without_screentime():
+    """Import a separate copy of screentime_api as if screentime.py were missing."""
+    with mock.patch.dict(sys.modules):
+        sys.modules.pop("screentime_api", None)
+        sys.modules["screentime"] = None  # Makes the import raise ImportError
+        return importlib.import_module("screentime_api")
+
+
+class ServerOnlyModeTest(ApiTestCase):
+    """The API on a host without screentime.py, reading only uploaded data."""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.api = import_api_without_screentime()
+
+    def test_reads_uploaded_data(self):
+        self.assertFalse(self.api.HAS_LOCAL_DB)
+        self.start_client()
+        self.upload([
+            {"app_name": "Safari", "duration_seconds": 30.0,
+             "start_time": "2026-01-05T09:00:00", "end_time": "2026-01-05T09:00:30"},
+            {"app_name": "Mail", "duration_seconds": 60.0,
+             "start_time": "2026-01-05T10:00:00", "end_time": "2026-01-05T10:01:00"},
+        ])
+
+        usage = self.client.get("/usage")
+        self.assertEqual(usage.status_code, 200, usage.text)
+        self.assertEqual(usage.json()["record_count"], 2)
+
+        summary = self.client.get("/summary")
+        self.assertEqual(summary.status_code, 200, summary.text)
+        self.assertEqual(summary.json()["total_duration_seconds"], 90.0)
+
+        daily = self.client.get("/daily")
+        self.assertEqual(daily.status_code, 200, daily.text)
+        self.assertEqual([day["date"] for day in daily.json()["days"]], ["2026-01-05"])
+
+        for params in ["format=json", "format=json&summary=true", "format=csv&summary=true"]:
+            export = self.client.get(f"/export?{params}")
+            self.assertEqual(export.status_code, 200, (params, export.text))
+        self.assertEqual(len(json.loads(self.client.get("/export?format=json").content)), 2)
+
+
+class UsagePaginationTest(ApiTestCase):
+    """Walking /usage page by page through next_cursor."""
+
+    # Sessions share start times in threes, so pages split ties
+    SESSION_COUNT = 40
+
+    def walk_usage(self, limit: int) -> list[str]:
+        """Return the app names of every page of /usage?limit=N, in order."""
+        app_names = []
+        cursor = None
+        for _ in range(self.SESSION_COUNT + 1):
+            params = {"limit": limit}
+            if cursor:
+                params["cursor"] = cursor
+            response = self.client.get("/usage", params=params)
+            self.assertEqual(response.status_code, 200, response.text)
+            page = response.json()
+            self.assertLessEqual(page["record_count"], limit)
+            app_names.extend(record["app_name"] for record in page["records"])
+            cursor = page["next_cursor"]
+            if cursor is None:
+                return app_names
+        self.fail(f"/usage?limit={limit} never ran out of pages")
+
+    def assert_walks_every_session_once(self, expected: list[str]):
+        for limit in [1, 2, 3, 7, self.SESSION_COUNT, 100]:
+            with self.subTest(limit=limit):
+                self.assertEqual(self.walk_usage(limit), expected)
+
+    def test_walks_local_sessions(self):
+        start = 790000000
+        sessions = []
+        for i in range(self.SESSION_COUNT):
+            session_start = start + (i // 3) * 60
+            # knowledgeC.db holds REAL timestamps, but INTEGER ones compare
+            # equal to them; the cursor has to keep both exact
+            if i % 2:
+                session_start = float(session_start)
+            sessions.append((f"app{i:02d}", session_start, session_start + 30))
+        create_knowledge_db(self.local_db_path, sessions)
+        self.start_client()
+
+        # Newest first; ties by insertion order, newest first too
+        expected = [name for name, _, _ in reversed(sessions)]
+        self.assert_walks_every_session_once(expected)
+
+    def test_walks_uploaded_sessions(self):
+        self.start_client()
+        records = [
+            {
+                "app_name": f"app{i:02d}",
+                "duration_seconds": 30.0,
+                "start_time": f"2026-01-05T09:{i // 3:02d}:00",
+                "end_time": f"2026-01-05T09:{i // 3:02d}:30",
+            }
+            for i in range(self.SESSION_COUNT)
+        ]
+        # Uploaded out of order, so ids don't follow start times
+        self.upload(records[1::2])
+        self.upload(records[::2])
+
+        by_id = records[1::2] + records[::2]
+        expected = [
+            record["app_name"]
+            for _, record in sorted(
+                enumerate(by_id), key=lambda item: (item[1]["start_time"], item[0]), reverse=True
+            )
+        ]
+        self.assert_walks_every_session_once(expected)
+
+    def test_rejects_malformed_cursor(self):
+        self.start_client()
+        self.upload([{"app_name": "Safari", "duration_seconds": 30.0,
+                      "start_time": "2026-01-05T09:00:00", "end_time": "2026-01-05T09:00:30"}])
+        for cursor in ["", "garbage", "1.5", "1.5|x", "1|2|3"]:
+            with self.subTest(cursor=cursor):
+                response = self.client.get("/usage", params={"limit": 1, "cursor": cursor})
+                self.assertEqual(response.status_code, 400, response.text)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,68 @@
+"""Tests for the exports in sync_screentime.py."""
+
+import shutil
+import sqlite3
+import tempfile
+import unittest
+from datetime import datetime, timedelta
+from pathlib import Path
+
+from sync_screentime import export_usage_db, get_usage_data
+from tests.helpers import apple_time, create_knowledge_db
+
+
+def recent_sessions(now: datetime) -> list[tuple]:
+    """Sessions of the past few days, with one older than a week and one still open."""
+    sessions = [
+        (f"com.example.app{i % 3}", apple_time(now - timedelta(hours=i, seconds=0.25)),
+         apple_time(now - timedelta(hours=i) + timedelta(seconds=30)))
+        for i in range(1, 50)
+    ]
+    sessions.append(("com.example.old", apple_time(now - timedelta(days=30)),
+                     apple_time(now - timedelta(days=30) + timedelta(seconds=30))))
+    sessions.append(("com.example.open", apple_time(now - timedelta(minutes=5)), None))
+    return sessions
+
+
+class ExportUsageDbTest(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, self.temp_dir, ignore_errors=True)
+        self.db_path = self.temp_dir / "knowledgeC.db"
+        self.export_path = self.temp_dir / "export.db"
+        create_knowledge_db(self.db_path, recent_sessions(datetime.now()))
+
+    def read_export(self) -> list[dict]:
+        conn = sqlite3.connect(self.export_path)
+        conn.row_factory = sqlite3.Row
+        try:
+            return [dict(row) for row in conn.execute("SELECT * FROM usage")]
+        finally:
+            conn.close()
+
+    def sort_key(self, record: dict) -> tuple:
+        return record["start_time"], record["app_name"]
+
+    def test_matches_uploaded_records(self):
+        count = export_usage_db(self.db_path, self.export_path, days_back=7)
+
+        exported = self.read_export()
+        self.assertEqual(count, len(exported))
+        self.assertEqual(count, 50)  # Not the session from 30 days ago
+        # Row for row what /upload would be sent
+        self.assertEqual(
+            sorted(exported, key=self.sort_key),
+            sorted(get_usage_data(self.db_path, days_back=7), key=self.sort_key),
+        )
+
+        open_session = next(r for r in exported if r["app_name"] == "com.example.open")
+        self.assertEqual((open_session["duration_seconds"], open_session["end_time"]), (0, None))
+
+    def test_replaces_previous_export(self):
+        export_usage_db(self.db_path, self.export_path, days_back=60)
+        count = export_usage_db(self.db_path, self.export_path, days_back=7)
+        self.assertEqual(len(self.read_export()), count)
+
+
+if __name__ == "__main__":
+    unittest.main()